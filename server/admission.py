@@ -0,0 +1,208 @@
+"""
+admission.py
+------------
+Admission control and graceful degradation for /ws/chaos.
+
+Each WebSocket gets a ``Session`` from ``controller.session(ws)``. main.py
+reads every socket in its own task and calls ``session.offer(payload)`` the
+moment a message arrives:
+
+    rate limit   token bucket per session (``APEX_RATE_PER_SEC`` sustained,
+                 ``APEX_RATE_BURST`` burst), charged on arrival
+    backlog      admitted messages wait in a bounded per-session queue
+                 (``APEX_SESSION_QUEUE``); a full queue rejects at once as
+                 backlog_full, before any token is spent, so requests never
+                 pile up behind a slow socket
+
+A per-socket worker drains the queue through ``controller.slot(arrived)``:
+
+    concurrency  at most ``APEX_MAX_CONCURRENT`` events in flight across all
+                 sockets; a message waits up to ``APEX_QUEUE_TIMEOUT_S`` for a
+                 slot, then is rejected as overloaded
+
+Latency is measured from arrival, so time spent queued counts. When the p95
+of the last ``WINDOW`` requests breaches ``APEX_SLO_MS`` the controller switches to
+``degraded`` mode, in which main.py runs ``DEGRADED_SIMS`` simulations,
+prefers cached results and formats radio calls from a template instead of
+calling the LLM. After at least ``APEX_DEGRADED_MIN_S`` it returns to
+``normal`` once the p95 is back under ``RECOVER_FRACTION`` of the SLO.
+
+Rejected messages raise ``Rejected`` carrying the reason and a retry hint.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable
+
+import numpy as np
+
+import metrics
+
+NORMAL = "normal"
+DEGRADED = "degraded"
+
+RATE_PER_SEC = float(os.environ.get("APEX_RATE_PER_SEC", "5"))
+RATE_BURST = float(os.environ.get("APEX_RATE_BURST", "10"))
+SESSION_QUEUE = int(os.environ.get("APEX_SESSION_QUEUE", "4"))
+MAX_CONCURRENT = int(os.environ.get("APEX_MAX_CONCURRENT", "4"))
+QUEUE_TIMEOUT_S = float(os.environ.get("APEX_QUEUE_TIMEOUT_S", "0.5"))
+SLO_S = float(os.environ.get("APEX_SLO_MS", "1500")) / 1000
+DEGRADED_MIN_S = float(os.environ.get("APEX_DEGRADED_MIN_S", "10"))
+DEGRADED_SIMS = int(os.environ.get("APEX_DEGRADED_SIMS", "2000"))
+
+WINDOW = 20            # latencies the p95 is computed over
+MIN_SAMPLES = 5        # before the p95 is trusted
+RECOVER_FRACTION = 0.5
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def take(self) -> float:
+        """Consume a token; returns 0 if allowed, else seconds until one is free."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Session:
+    """Admission state for one WebSocket: token bucket + bounded backlog."""
+
+    def __init__(self, rate: float, burst: float, max_queue: int,
+                 drain_s: Callable[[], float]):
+        self.bucket = TokenBucket(rate, burst)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._drain_s = drain_s
+
+    def offer(self, payload: dict) -> None:
+        """Queue ``payload`` (stamped with its arrival time) or raise ``Rejected``.
+
+        The backlog is checked first so a message that cannot be queued does
+        not spend a token; its retry hint is how long the head of the queue
+        typically takes to clear, not the token rate.
+        """
+        if self.queue.full():
+            metrics.ADMISSION.inc("backlog_full")
+            raise Rejected("backlog_full", self._drain_s())
+        wait = self.bucket.take()
+        if wait:
+            metrics.ADMISSION.inc("rate_limited")
+            raise Rejected("rate_limited", wait)
+        self.queue.put_nowait((payload, time.perf_counter()))
+
+
+class AdmissionController:
+    def __init__(self, rate: float = RATE_PER_SEC, burst: float = RATE_BURST,
+                 max_queue: int = SESSION_QUEUE,
+                 max_concurrent: int = MAX_CONCURRENT,
+                 queue_timeout: float = QUEUE_TIMEOUT_S, slo_s: float = SLO_S,
+                 degraded_min_s: float = DEGRADED_MIN_S):
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.slo_s = slo_s
+        self.degraded_min_s = degraded_min_s
+        self.mode = NORMAL
+        self._since = time.monotonic()
+        self._sessions: dict = {}
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._inflight = 0
+        self._latencies: deque = deque(maxlen=WINDOW)
+
+    def session(self, key) -> Session:
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = Session(self.rate, self.burst,
+                                                    self.max_queue, self.drain_s)
+        return session
+
+    def forget(self, key) -> None:
+        self._sessions.pop(key, None)
+
+    def p95(self) -> float | None:
+        if len(self._latencies) < MIN_SAMPLES:
+            return None
+        return float(np.percentile(self._latencies, 95))
+
+    def drain_s(self) -> float:
+        """Typical time for one queued message to finish (median latency)."""
+        if not self._latencies:
+            return self.slo_s
+        return float(np.median(self._latencies))
+
+    def record(self, seconds: float) -> None:
+        """Feed one request latency and switch mode if the SLO says so."""
+        self._latencies.append(seconds)
+        p95 = self.p95()
+        if p95 is None:
+            return
+        now = time.monotonic()
+        if self.mode == NORMAL and p95 > self.slo_s:
+            self._switch(DEGRADED, now, p95)
+        elif (self.mode == DEGRADED and now - self._since >= self.degraded_min_s
+              and p95 < self.slo_s * RECOVER_FRACTION):
+            self._switch(NORMAL, now, p95)
+
+    def _switch(self, mode: str, now: float, p95: float) -> None:
+        print(f"Admission: {self.mode} → {mode} (p95 {p95 * 1000:.0f}ms, "
+              f"SLO {self.slo_s * 1000:.0f}ms)")
+        self.mode = mode
+        self._since = now
+        # Judge the new mode on its own latencies
+        self._latencies.clear()
+
+    @asynccontextmanager
+    async def slot(self, arrived: float):
+        """Hold a concurrency slot for one request; yields the active mode.
+
+        ``arrived`` is the ``perf_counter()`` stamp from ``Session.offer``.
+        """
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            metrics.ADMISSION.inc("overloaded")
+            raise Rejected("overloaded", self.queue_timeout) from None
+        metrics.ADMISSION.inc("admitted")
+
+        self._inflight += 1
+        try:
+            yield self.mode
+        finally:
+            self._inflight -= 1
+            self._slots.release()
+            self.record(time.perf_counter() - arrived)
+
+    def status(self) -> dict:
+        p95 = self.p95()
+        return {"mode": self.mode,
+                "since_s": round(time.monotonic() - self._since, 1),
+                "p95_ms": None if p95 is None else round(p95 * 1000, 1),
+                "slo_ms": round(self.slo_s * 1000, 1),
+                "inflight": self._inflight,
+                "max_concurrent": self.max_concurrent,
+                "sessions": len(self._sessions),
+                "queued": sum(s.queue.qsize() for s in self._sessions.values())}
+
+
+controller = AdmissionController()
+metrics.DEGRADED.set_function(lambda: float(controller.mode == DEGRADED))
@@ -0,0 +1,286 @@
+"""
+backtest.py
+-----------
+Historical backtest of the strategy engine against real race outcomes.
+
+Every lap of every driver is a decision point. At each one the simulator is
+queried with the real race state (tyre age, compound, position, stint,
+weather, laps left) and its output is scored against what actually happened:
+
+    Win probability   Brier score and log loss of win_probability vs. the
+                      driver actually winning, with a calibration table.
+    Pit timing        for every real pit stop, the Stage 2 model prices each
+                      pit lap within ±PIT_WINDOW laps (old tyres up to the
+                      stop, the real next compound fresh after it). The
+                      model-optimal lap is compared with the real one; regret
+                      is the model-estimated seconds the real lap cost.
+                      Pit-lane loss is the same for every candidate lap, so
+                      it cancels out.
+
+Decision points are batched (one Stage 2 predict call and one
+simulate_batch call per work unit) and work units (GP × driver group) are
+spread over a process pool.
+
+Note that the 10 training GPs are in-sample for Stage 2; the held-out
+Italy GP is the honest number. Results → data/backtest_report.json.
+
+Usage (from server/):
+    python backtest.py                          # held-out GP only
+    python backtest.py --split all --workers 8
+    python backtest.py --every 3 --sims 2000
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+TRAIN_CSV = "data/laps_train.csv"
+TEST_CSV = "data/laps_test.csv"
+REPORT_PATH = "data/backtest_report.json"
+
+PIT_WINDOW = 5        # laps either side of the real stop to price
+DRIVER_GROUPS = 4     # work units per GP
+STATE_COLS = ["TyreLife", "Compound", "LapNumber", "Position", "Stint",
+              "FreshTyre", "AirTemp", "TrackTemp", "Humidity", "Rainfall"]
+
+
+# ──────────────────────────────────────────────
+# Data
+# ──────────────────────────────────────────────
+def load_laps(split: str) -> pd.DataFrame:
+    from train_engine import engineer_features
+
+    paths = {"test": [TEST_CSV], "train": [TRAIN_CSV],
+             "all": [TRAIN_CSV, TEST_CSV]}[split]
+    frames = []
+    for path in paths:
+        df = pd.read_csv(path)
+        df["Split"] = "test" if path == TEST_CSV else "train"
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True)
+    df = df.dropna(subset=["LapNumber"]).sort_values(["GP", "Driver", "LapNumber"])
+    df = engineer_features(df)
+
+    df["Compound"] = df["Compound"].fillna("UNKNOWN").astype(str).str.upper()
+    df["TyreLife"] = df["TyreLife"].fillna(1)
+    df["FreshTyre"] = df["FreshTyre"].fillna(0).astype(int)
+    df["TotalLaps"] = df.groupby("GP")["LapNumber"].transform("max").astype(int)
+
+    # Outcome: classified position on each driver's final lap
+    final_pos = df.groupby(["GP", "Driver"])["Position"].transform("last")
+    df["Won"] = (final_pos == 1).astype(int)
+    return df.reset_index(drop=True)
+
+
+def work_units(df: pd.DataFrame, groups: int) -> list[pd.DataFrame]:
+    units = []
+    for _, gp_df in df.groupby("GP"):
+        drivers = np.array(sorted(gp_df["Driver"].unique()))
+        for chunk in np.array_split(drivers, min(groups, len(drivers))):
+            units.append(gp_df[gp_df["Driver"].isin(chunk)])
+    return units
+
+
+# ──────────────────────────────────────────────
+# Per-unit evaluation (runs in worker processes)
+# ──────────────────────────────────────────────
+def _frame(sim, rows: pd.DataFrame, est_pace: float, total_laps: int,
+           **overrides) -> pd.DataFrame:
+    cols = {c: rows[c].to_numpy() for c in STATE_COLS}
+    cols.update(overrides)
+    return sim.stage2_frame(
+        tire_age=cols["TyreLife"], compound=cols["Compound"],
+        lap_number=cols["LapNumber"], air_temp=cols["AirTemp"],
+        track_temp=cols["TrackTemp"], humidity=cols["Humidity"],
+        rainfall=cols["Rainfall"], position=cols["Position"],
+        stint=cols["Stint"], fresh_tyre=cols["FreshTyre"],
+        est_base_pace=est_pace, total_laps=total_laps)
+
+
+def _decision_points(sim, unit, est_pace, total_laps, every, sims, rng):
+    points = unit[(unit["LapNumber"] < total_laps)
+                  & (unit["LapNumber"] % every == 0)]
+    if points.empty:
+        return pd.DataFrame()
+    baselines = sim.predict_lap_times(_frame(sim, points, est_pace, total_laps))
+    laps_left = total_laps - points["LapNumber"].to_numpy(dtype=int)
+    out = sim.simulate_batch(baselines, laps_left, num_sims=sims, rng=rng)
+    return pd.DataFrame({
+        "GP": points["GP"].to_numpy(),
+        "Split": points["Split"].to_numpy(),
+        "Driver": points["Driver"].to_numpy(),
+        "LapNumber": points["LapNumber"].to_numpy(dtype=int),
+        "win_probability": out["win_probability"],
+        "Won": points["Won"].to_numpy(),
+    })
+
+
+def _pit_regret(sim, unit, est_pace, total_laps):
+    """Model-optimal vs. real pit lap for every stop in ``unit``."""
+    stops, grids = [], []
+    for driver, laps in unit.groupby("Driver"):
+        laps = laps.set_index("LapNumber")
+        for a in laps.index[laps["PitInTime"].notna()]:
+            if a + 1 not in laps.index or a >= total_laps:
+                continue
+            before, after = laps.loc[a], laps.loc[a + 1]
+            cand = np.arange(max(a - PIT_WINDOW, 1), min(a + PIT_WINDOW, total_laps - 1) + 1)
+            window = np.arange(cand[0], cand[-1] + 2)
+            P, L = np.meshgrid(cand, window, indexing="ij")
+            on_old = L <= P
+            n = P.size
+            grids.append(pd.DataFrame({
+                "stop": len(stops), "pit_lap": P.ravel(),
+                "TyreLife": np.where(on_old, before["TyreLife"] + (L - a), L - P).clip(1).ravel(),
+                "Compound": np.where(on_old, before["Compound"], after["Compound"]).ravel(),
+                "LapNumber": L.ravel(),
+                "Position": np.full(n, before["Position"]),
+                "Stint": np.where(on_old, before["Stint"], before["Stint"] + 1).ravel(),
+                "FreshTyre": np.where(on_old, before["FreshTyre"], 1).ravel(),
+                "AirTemp": np.full(n, before["AirTemp"]),
+                "TrackTemp": np.full(n, before["TrackTemp"]),
+                "Humidity": np.full(n, before["Humidity"]),
+                "Rainfall": np.full(n, before["Rainfall"]),
+            }))
+            stops.append({"GP": before["GP"], "Split": before["Split"],
+                          "Driver": driver, "actual_lap": int(a)})
+    if not stops:
+        return pd.DataFrame()
+
+    grid = pd.concat(grids, ignore_index=True)
+    grid["t"] = sim.predict_lap_times(_frame(sim, grid, est_pace, total_laps))
+    cost = grid.groupby(["stop", "pit_lap"])["t"].sum().reset_index()
+    best = cost.loc[cost.groupby("stop")["t"].idxmin()].set_index("stop")
+
+    result = pd.DataFrame(stops)
+    result["recommended_lap"] = best["pit_lap"].reindex(result.index).to_numpy()
+    actual_cost = cost.set_index(["stop", "pit_lap"])["t"].reindex(
+        list(zip(result.index, result["actual_lap"]))).to_numpy()
+    result["regret_s"] = actual_cost - best["t"].reindex(result.index).to_numpy()
+    return result
+
+
+def backtest_unit(task: tuple) -> tuple[pd.DataFrame, pd.DataFrame]:
+    unit, every, sims, seed = task
+    import simulator as sim
+
+    if sim.xgb_model is None and not sim.load_resources():
+        raise RuntimeError("model artifacts not available")
+    first = unit.iloc[0]
+    est_pace = float(sim.estimate_base_pace(first["TrackLength"], first["Corners"])[0])
+    total_laps = int(first["TotalLaps"])
+    rng = np.random.default_rng(seed)
+    return (_decision_points(sim, unit, est_pace, total_laps, every, sims, rng),
+            _pit_regret(sim, unit, est_pace, total_laps))
+
+
+# ──────────────────────────────────────────────
+# Scoring
+# ──────────────────────────────────────────────
+def score_win_probability(points: pd.DataFrame) -> dict:
+    p = np.clip(points["win_probability"].to_numpy() / 100.0, 1e-6, 1 - 1e-6)
+    y = points["Won"].to_numpy()
+    base = y.mean()
+    bins = np.minimum((p * 10).astype(int), 9)
+    calibration = [{"bin": f"{b * 10}-{b * 10 + 10}%",
+                    "n": int((bins == b).sum()),
+                    "mean_predicted": round(float(p[bins == b].mean()), 3),
+                    "observed_win_rate": round(float(y[bins == b].mean()), 3)}
+                   for b in range(10) if (bins == b).any()]
+    return {
+        "n": int(len(p)),
+        "brier": round(float(np.mean((p - y) ** 2)), 4),
+        "brier_base_rate": round(float(np.mean((base - y) ** 2)), 4),
+        "log_loss": round(float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p))), 4),
+        "calibration": calibration,
+    }
+
+
+def score_pit_timing(stops: pd.DataFrame) -> dict:
+    if stops.empty:
+        return {"n": 0}
+    err = (stops["actual_lap"] - stops["recommended_lap"]).abs()
+    return {
+        "n": int(len(stops)),
+        "mean_abs_lap_error": round(float(err.mean()), 2),
+        "within_2_laps": round(float((err <= 2).mean()), 3),
+        "mean_regret_s": round(float(stops["regret_s"].mean()), 3),
+        "median_regret_s": round(float(stops["regret_s"].median()), 3),
+    }
+
+
+# ──────────────────────────────────────────────
+# Main
+# ──────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Backtest strategy recommendations.")
+    parser.add_argument("--split", choices=("test", "train", "all"), default="test")
+    parser.add_argument("--every", type=int, default=1,
+                        help="use every Nth lap as a decision point")
+    parser.add_argument("--sims", type=int, default=10_000,
+                        help="Monte Carlo draws per decision point")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    print(f"Loading laps ({args.split}) …")
+    df = load_laps(args.split)
+    units = work_units(df, DRIVER_GROUPS)
+    print(f"  {len(df):,} laps  |  {df['GP'].nunique()} GPs  |  "
+          f"{len(units)} work units  |  {args.workers} workers")
+
+    tasks = [(u, max(args.every, 1), args.sims, args.seed + i)
+             for i, u in enumerate(units)]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(backtest_unit, tasks))
+
+    points = pd.concat([r[0] for r in results], ignore_index=True)
+    stops = pd.concat([r[1] for r in results], ignore_index=True)
+    elapsed = time.perf_counter() - t0
+
+    report = {"split": args.split, "every": args.every, "sims": args.sims,
+              "elapsed_s": round(elapsed, 2),
+              "decision_points_per_s": round(len(points) / elapsed, 1),
+              "overall": {"win_probability": score_win_probability(points),
+                          "pit_timing": score_pit_timing(stops)},
+              "per_gp": {}}
+    for gp in sorted(points["GP"].unique()):
+        split = points.loc[points["GP"] == gp, "Split"].iloc[0]
+        report["per_gp"][gp] = {
+            "split": split,
+            "win_probability": score_win_probability(points[points["GP"] == gp]),
+            "pit_timing": score_pit_timing(stops[stops["GP"] == gp] if not stops.empty else stops),
+        }
+
+    print(f"\n{'=' * 55}")
+    print(f"  BACKTEST  ({len(points):,} decision points, "
+          f"{len(stops):,} pit stops, {elapsed:.1f}s)")
+    print(f"{'=' * 55}")
+    for gp, r in report["per_gp"].items():
+        wp, pit = r["win_probability"], r["pit_timing"]
+        print(f"  {gp:>15} [{r['split']:>5}]: Brier={wp['brier']:.4f} "
+              f"(base {wp['brier_base_rate']:.4f})  "
+              f"pit |err|={pit.get('mean_abs_lap_error', float('nan')):.2f} laps  "
+              f"regret={pit.get('mean_regret_s', float('nan')):.2f}s")
+    ov = report["overall"]
+    print(f"\n  Overall Brier : {ov['win_probability']['brier']:.4f}  "
+          f"(base rate {ov['win_probability']['brier_base_rate']:.4f})")
+    if ov["pit_timing"]["n"]:
+        print(f"  Pit timing    : {ov['pit_timing']['mean_abs_lap_error']:.2f} laps "
+              f"mean error, {ov['pit_timing']['mean_regret_s']:.2f}s mean regret")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n  Report → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""
+benchmark.py
+------------
+Benchmark suite for the simulation and serving hot paths.
+
+Suites:
+    sim        run_monte_carlo latency percentiles, one row per chaos event
+    predict    Stage 2 (preprocessor + XGBoost) batch prediction throughput
+    ws         /ws/chaos round-trip and broadcast fan-out to N clients,
+               against an in-process uvicorn server with the LLM stubbed out
+    cold       cold start: fresh interpreter importing main (loads models)
+    protocol   bytes on the wire and encode time, JSON vs MessagePack, raw
+               and with permessage-deflate-equivalent zlib compression
+
+Results are printed and written as JSON. With --baseline, every metric is
+compared against a stored run and the script exits non-zero if any metric
+regressed by more than --tolerance.
+
+Usage (from server/):
+    python benchmark.py                              # all suites
+    python benchmark.py --suites sim,predict
+    python benchmark.py --save-baseline              # write bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json --tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+DEFAULT_OUTPUT = "bench_results.json"
+DEFAULT_BASELINE = "bench_baseline.json"
+
+SIM_EVENTS = [
+    "strategy_update", "minor_crash", "major_crash", "rain",
+    "heatwave", "traffic", "tyre_failure", "penalty_5s", "tyre_deg",
+    "rain+major_crash",
+]
+
+SIM_STATE = dict(current_tire_age=15, compound_str="MEDIUM", laps_left=30,
+                 air_temp=25.0, track_temp=35.0, humidity=50.0, rainfall=0,
+                 position=10, stint=1, fresh_tyre=False)
+
+
+def _percentiles(samples_s: list[float]) -> dict:
+    ms = np.asarray(samples_s) * 1000.0
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+# ── Suites ────────────────────────────────────────────────────────────────
+
+def bench_sim(iterations: int) -> dict:
+    """run_monte_carlo latency percentiles per chaos event.
+
+    The result cache is cleared before every call so each row measures the
+    full pipeline; the ``cached`` row measures a repeated-state hit.
+    """
+    from simulator import clear_result_cache, run_monte_carlo
+
+    run_monte_carlo(**SIM_STATE)  # warm-up (lazy model load, caches)
+    out = {}
+    for event in SIM_EVENTS:
+        samples = []
+        for _ in range(iterations):
+            clear_result_cache()
+            t0 = time.perf_counter()
+            run_monte_carlo(event=event, **SIM_STATE)
+            samples.append(time.perf_counter() - t0)
+        out[event] = _percentiles(samples)
+        print(f"  sim  {event:>18}: p50={out[event]['p50_ms']:.2f}ms  "
+              f"p99={out[event]['p99_ms']:.2f}ms")
+
+    run_monte_carlo(**SIM_STATE)  # prime the cache
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        run_monte_carlo(**SIM_STATE)
+        samples.append(time.perf_counter() - t0)
+    out["cached"] = _percentiles(samples)
+    print(f"  sim  {'cached':>18}: p50={out['cached']['p50_ms']:.3f}ms  "
+          f"p99={out['cached']['p99_ms']:.3f}ms")
+    return out
+
+
+def bench_predict(batch_sizes: list[int], repeats: int = 5) -> dict:
+    """Stage 2 predict throughput (rows/sec) for several batch sizes."""
+    import pandas as pd
+    import simulator
+
+    if simulator.xgb_model is None and not simulator.load_resources():
+        raise RuntimeError("model artifacts not available")
+
+    row = simulator._build_input_row(15, "MEDIUM", 23, 25.0, 35.0, 50.0, 0)
+    out = {}
+    for n in batch_sizes:
+        frame = pd.concat([row] * n, ignore_index=True)
+        frame["TyreLife"] = np.arange(n) % 40
+        frame["LapNumber"] = np.arange(n) % simulator.MONZA_TOTAL_LAPS + 1
+        best = float("inf")
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            simulator.xgb_model.predict(simulator.preprocessor.transform(frame))
+            best = min(best, time.perf_counter() - t0)
+        out[f"batch_{n}"] = {
+            "rows_per_sec": round(n / best, 1),
+            "latency_ms": round(best * 1000.0, 3),
+        }
+        print(f"  predict batch={n:>6}: {n / best:,.0f} rows/s  "
+              f"({best * 1000:.2f}ms)")
+    return out
+
+
+async def _stub_radio_call(math_results: dict, event: str,
+                           use_llm: bool = True) -> str:
+    """Local stand-in for the OpenRouter call so the LLM is not measured."""
+    return f"Stub radio call for {event or 'strategy check'}."
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(port: int):
+    import uvicorn
+    import admission
+    import main
+
+    main.generate_radio_call = _stub_radio_call
+    # One sender fires rounds back to back; measure the server, not the limiter
+    admission.controller = admission.AdmissionController(
+        rate=float("inf"), burst=float("inf"))
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=port,
+                            log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("uvicorn did not start within 30s")
+        time.sleep(0.05)
+    return server, thread
+
+
+async def _ws_round(uri: str, clients: int, rounds: int) -> dict:
+    import websockets
+    from simulator import clear_result_cache
+
+    conns = [await websockets.connect(uri) for _ in range(clients)]
+    sender = conns[0]
+    rtt, fanout = [], []
+    try:
+        for i in range(rounds):
+            payload = json.dumps({"event": SIM_EVENTS[i % len(SIM_EVENTS)]})
+            # Measure simulate + broadcast, not result-cache hits (the
+            # server runs in this process, so this is the same cache)
+            clear_result_cache()
+            t0 = time.perf_counter()
+            await sender.send(payload)
+
+            async def _recv(ws):
+                await ws.recv()
+                return time.perf_counter() - t0
+
+            done = await asyncio.gather(*(_recv(ws) for ws in conns))
+            rtt.append(done[0])
+            fanout.append(max(done))
+    finally:
+        await asyncio.gather(*(ws.close() for ws in conns))
+    return {"round_trip": _percentiles(rtt),
+            "broadcast_all_clients": _percentiles(fanout)}
+
+
+def bench_ws(client_counts: list[int], rounds: int) -> dict:
+    """WebSocket round-trip and broadcast fan-out under N synthetic clients."""
+    port = _free_port()
+    server, thread = _start_server(port)
+    uri = f"ws://127.0.0.1:{port}/ws/chaos"
+    out = {}
+    try:
+        for n in client_counts:
+            res = asyncio.run(_ws_round(uri, n, rounds))
+            out[f"clients_{n}"] = res
+            print(f"  ws   clients={n:>4}: rtt p50="
+                  f"{res['round_trip']['p50_ms']:.2f}ms  fan-out p99="
+                  f"{res['broadcast_all_clients']['p99_ms']:.2f}ms")
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+    return out
+
+
+def bench_cold(repeats: int) -> dict:
+    """Cold start: fresh interpreter importing main (model load included)."""
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-W", "ignore", "-c", "import main"],
+                       check=True, capture_output=True)
+        samples.append(time.perf_counter() - t0)
+    out = {"import_main": _percentiles(samples)}
+    print(f"  cold import main: p50={out['import_main']['p50_ms']:.0f}ms")
+    return out
+
+
+def _sample_payloads() -> dict:
+    """A current chaos response and a large sweep-style response."""
+    rng = np.random.default_rng(0)
+    math_results = {
+        "predicted_total_time": 2477.06, "win_probability": 76,
+        "recommendation": "Box for Intermediates immediately! Losing 15s/lap on MEDIUMs.",
+        "math_baseline_lap": 81.12, "events": ["rain"],
+    }
+    sweep = dict(math_results)
+    sweep.update({
+        "position_distribution": rng.random(20),
+        "lap_time_curves": rng.normal(82.0, 0.5, (10, 53)),
+        "strategy_sweep": rng.random((53, 3, 2)).astype(np.float32),
+    })
+    return {
+        "chaos_response": {"event": "rain", "math_results": math_results,
+                           "radio_call": "Box box box! Rain is here."},
+        "sweep_response": {"event": "strategy_update", "math_results": sweep,
+                           "radio_call": "Routine check."},
+    }
+
+
+def bench_protocol(repeats: int = 200) -> dict:
+    """Encoded size and encode time for each wire encoding."""
+    import protocol
+
+    out = {}
+    for name, message in _sample_payloads().items():
+        out[name] = {}
+        for encoding in protocol.available_encodings():
+            t0 = time.perf_counter()
+            for _ in range(repeats):
+                frame = protocol.encode(message, encoding)
+            encode_s = (time.perf_counter() - t0) / repeats
+            raw = frame.encode() if isinstance(frame, str) else frame
+            deflated = zlib.compress(raw, 6)
+            out[name][encoding] = {
+                "encode_ms": round(encode_s * 1000.0, 4),
+                "bytes": len(raw),
+                "deflate_bytes": len(deflated),
+            }
+            print(f"  protocol {name:>15} {encoding:>8}: {len(raw):>7,} B  "
+                  f"deflate {len(deflated):>7,} B  encode {encode_s * 1e6:.1f}µs")
+    return out
+
+
+# ── Baseline comparison ───────────────────────────────────────────────────
+
+def _flatten(d: dict, prefix: str = "") -> dict:
+    flat = {}
+    for k, v in d.items():
+        key = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            flat.update(_flatten(v, key))
+        elif isinstance(v, (int, float)):
+            flat[key] = float(v)
+    return flat
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return a list of regressions beyond ``tolerance`` (fractional).
+
+    Metrics ending in ``_ms`` are lower-is-better; ``rows_per_sec`` is
+    higher-is-better. Metrics missing from either side are ignored.
+    """
+    cur = _flatten(results.get("suites", {}))
+    base = _flatten(baseline.get("suites", {}))
+    regressions = []
+    for key, old in base.items():
+        new = cur.get(key)
+        if new is None or old <= 0:
+            continue
+        if key.endswith("_ms") and new > old * (1 + tolerance):
+            regressions.append(f"{key}: {old:.3f} → {new:.3f} ms "
+                               f"(+{(new / old - 1) * 100:.0f}%)")
+        elif key.endswith("rows_per_sec") and new < old * (1 - tolerance):
+            regressions.append(f"{key}: {old:,.0f} → {new:,.0f} rows/s "
+                               f"({(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+# ── Main ──────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", default="sim,predict,ws,cold,protocol",
+                        help="comma-separated subset of: "
+                             "sim,predict,ws,cold,protocol")
+    parser.add_argument("--iterations", type=int, default=50,
+                        help="run_monte_carlo calls per event")
+    parser.add_argument("--batch-sizes", default="1,100,10000")
+    parser.add_argument("--clients", default="1,10,50",
+                        help="WebSocket client counts to fan out to")
+    parser.add_argument("--rounds", type=int, default=20,
+                        help="chaos events sent per client count")
+    parser.add_argument("--cold-repeats", type=int, default=3)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=None,
+                        help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed fractional regression before failing")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help=f"also write results to {DEFAULT_BASELINE}")
+    args = parser.parse_args()
+
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "suites": {},
+    }
+
+    runners = {
+        "sim": lambda: bench_sim(args.iterations),
+        "predict": lambda: bench_predict(
+            [int(n) for n in args.batch_sizes.split(",")]),
+        "ws": lambda: bench_ws(
+            [int(n) for n in args.clients.split(",")], args.rounds),
+        "cold": lambda: bench_cold(args.cold_repeats),
+        "protocol": lambda: bench_protocol(),
+    }
+    for name in suites:
+        if name not in runners:
+            parser.error(f"unknown suite '{name}'")
+        print(f"\n── {name} ──")
+        results["suites"][name] = runners[name]()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults → {args.output}")
+
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline → {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS (> {args.tolerance:.0%}):")
+            for r in regressions:
+                print(f"  {r}")
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.baseline} "
+              f"(tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
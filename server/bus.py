@@ -0,0 +1,201 @@
+"""
+bus.py
+------
+Pluggable broadcast backend so /ws/chaos results reach every client, not
+just the ones connected to the uvicorn worker that ran the simulation.
+
+    LocalBus   default; ``publish`` delivers straight to this process's
+               clients (single worker, no extra hops)
+    RedisBus   Redis-compatible pub/sub over TCP or a Unix socket
+               (``APEX_BUS=redis://localhost:6379/0`` or
+               ``APEX_BUS=unix:///tmp/redis.sock``); every worker subscribes,
+               so a publish fans out to all workers, including the sender
+    MemoryBus  in-memory stand-in for RedisBus: buses sharing a ``MemoryHub``
+               behave like workers on one server; payloads cross the hub as
+               UTF-8 JSON bytes, exactly as Redis delivers them
+
+Every backend takes a ``deliver(message)`` coroutine in ``start()``, which
+main.py points at ``ConnectionManager.deliver_local``. ``redis`` is optional
+and only imported when a Redis URL is configured.
+
+``python bus.py`` checks backend selection and the fan-out: two MemoryBus
+"workers" on one hub must both receive a single publish.
+"""
+
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+
+import protocol
+
+CHANNEL = "apex:broadcast"
+RECONNECT_S = 1.0
+
+Deliver = Callable[[dict], Awaitable[None]]
+
+
+class LocalBus:
+    def __init__(self):
+        self._deliver: Deliver | None = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def publish(self, message: dict) -> None:
+        await self._deliver(message)
+
+    async def stop(self) -> None:
+        self._deliver = None
+
+
+class _SubscriberBus(ABC):
+    """Shared receive loop: parse each JSON payload and hand it to ``deliver``."""
+
+    def __init__(self, channel: str = CHANNEL):
+        self.channel = channel
+        self._task: asyncio.Task | None = None
+
+    async def start(self, deliver: Deliver) -> None:
+        ready = asyncio.Event()
+        self._task = asyncio.create_task(self._run(deliver, ready))
+        await ready.wait()
+
+    @abstractmethod
+    async def _run(self, deliver: Deliver, ready: asyncio.Event) -> None:
+        """Subscribe, set ``ready``, then ``_dispatch`` every payload received."""
+
+    @abstractmethod
+    async def publish(self, message: dict) -> None:
+        ...
+
+    @staticmethod
+    async def _dispatch(deliver: Deliver, data: bytes) -> None:
+        # Always JSON: protocol.decode would read bytes as msgpack
+        try:
+            await deliver(json.loads(data))
+        except Exception as e:
+            print(f"Bus: dropped broadcast: {e}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class RedisBus(_SubscriberBus):
+    def __init__(self, url: str, channel: str = CHANNEL):
+        super().__init__(channel)
+        try:
+            import redis.asyncio as aioredis
+            from redis.exceptions import RedisError
+        except ImportError:
+            raise RuntimeError(f"APEX_BUS={url} needs the redis package") from None
+        self.url = url
+        self._redis = aioredis.from_url(url)
+        self._errors = (RedisError, OSError)
+
+    async def _run(self, deliver: Deliver, ready: asyncio.Event) -> None:
+        # Resubscribe after a dropped connection instead of going silent
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                ready.set()
+                async for msg in pubsub.listen():
+                    if msg["type"] == "message":
+                        await self._dispatch(deliver, msg["data"])
+            except self._errors as e:
+                print(f"Bus: lost {self.url} ({e}); retrying in {RECONNECT_S}s")
+                ready.set()  # don't hold up startup while the server is down
+                await asyncio.sleep(RECONNECT_S)
+            finally:
+                await pubsub.aclose()
+
+    async def publish(self, message: dict) -> None:
+        await self._redis.publish(self.channel,
+                                  protocol.encode(message, protocol.JSON))
+
+    async def stop(self) -> None:
+        await super().stop()
+        await self._redis.aclose()
+
+
+class MemoryHub:
+    """The "server" that MemoryBus instances publish through."""
+
+    def __init__(self):
+        self.subscribers: list[asyncio.Queue] = []
+
+
+class MemoryBus(_SubscriberBus):
+    def __init__(self, hub: MemoryHub | None = None, channel: str = CHANNEL):
+        super().__init__(channel)
+        self.hub = hub or MemoryHub()
+        self._queue: asyncio.Queue | None = None
+
+    async def _run(self, deliver: Deliver, ready: asyncio.Event) -> None:
+        self._queue = asyncio.Queue()
+        self.hub.subscribers.append(self._queue)
+        ready.set()
+        try:
+            while True:
+                await self._dispatch(deliver, await self._queue.get())
+        finally:
+            self.hub.subscribers.remove(self._queue)
+
+    async def publish(self, message: dict) -> None:
+        data = protocol.encode(message, protocol.JSON).encode()
+        for queue in list(self.hub.subscribers):
+            queue.put_nowait(data)
+
+
+def make_bus(url: str | None = None):
+    """Backend for ``APEX_BUS``: "local" (default), "memory", or a Redis URL."""
+    url = url if url is not None else os.environ.get("APEX_BUS", "local")
+    if url in ("", "local"):
+        return LocalBus()
+    if url == "memory":
+        return MemoryBus()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBus(url)
+    raise ValueError(f"unknown APEX_BUS backend: {url!r}")
+
+
+async def _self_check() -> None:
+    assert isinstance(make_bus("local"), LocalBus)
+    assert isinstance(make_bus("memory"), MemoryBus)
+    try:
+        make_bus("carrier-pigeon://")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown backend accepted")
+
+    hub = MemoryHub()
+    workers = [MemoryBus(hub), MemoryBus(hub)]
+    received: list[list[dict]] = [[], []]
+    for bus, inbox in zip(workers, received):
+        async def deliver(message: dict, inbox=inbox) -> None:
+            inbox.append(message)
+
+        await bus.start(deliver)
+
+    message = {"event": "rain", "math_results": {"win_probability": 42}}
+    await workers[0].publish(message)
+    await asyncio.sleep(0)
+    for bus in workers:
+        await bus.stop()
+
+    assert received == [[message], [message]], received
+    assert not hub.subscribers, "stopped buses must unsubscribe"
+    print("bus: publish on one worker reached both workers")
+
+
+if __name__ == "__main__":
+    asyncio.run(_self_check())
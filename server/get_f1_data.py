@@ -9,23 +9,30 @@ Training GPs (10): chosen to span the full range of circuit types
     — track lengths from 4.259 km (Netherlands) to 7.004 km (Belgium)
 
 Test GP (1): Italy / Monza — the race the demo replays, completely held out.
+Its full per-car position telemetry is also written to a memory-mapped
+store under data/telemetry/ (see telemetry_store.py).
 
 Circuit metadata (TrackLength, Corners) is attached to every lap so the
 model can learn to generalise across tracks rather than memorising one.
 """
 
-import fastf1
-import json
+import argparse
+import gzip
 import math
-import pandas as pd
 import os
 
+import fastf1
+import numpy as np
+import pandas as pd
+
+from race_index import LapIndex
+from telemetry_store import store_path, write_store
+
 if not os.path.exists("cache"):
     os.makedirs("cache")
 fastf1.Cache.enable_cache("cache")
 
 WEB_LIB = os.path.join(os.path.dirname(__file__), "..", "web", "lib")
-AVG_LAP_SEC = 86  # Monza average lap time for time→lap conversion
 
 RACES = [
     {"year": 2023, "gp": "Bahrain",       "track_km": 5.412, "corners": 15, "split": "train"},
@@ -48,7 +55,8 @@ LAP_COLS = [
     "SpeedI1", "SpeedI2", "SpeedFL", "SpeedST",
     "IsPersonalBest", "FreshTyre", "Team",
     "Position", "IsAccurate", "Stint",
-    "AirTemp", "TrackTemp", "Humidity", "Rainfall"
+    "AirTemp", "TrackTemp", "Humidity", "Rainfall",
+    "Time", "LapStartTime",
 ]
 
 TIMEDELTA_COLS = [
@@ -65,14 +73,17 @@ def _td_to_sec(series: pd.Series) -> pd.Series:
         return pd.to_numeric(series, errors="coerce")
 
 
-def _to_seconds(val):
-    """Convert a timedelta or numeric value to float seconds."""
-    if hasattr(val, "total_seconds"):
-        return val.total_seconds()
-    try:
-        return float(val)
-    except (TypeError, ValueError):
-        return 0.0
+def _session_seconds(series: pd.Series, t0_date=None) -> pd.Series:
+    """Session time in seconds from timedelta or absolute datetime values.
+
+    Race control messages carry wall-clock datetimes; everything else is
+    already a session timedelta.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if t0_date is None:
+            return (series - series.min()).dt.total_seconds()
+        return (series - pd.Timestamp(t0_date)).dt.total_seconds()
+    return _td_to_sec(series).fillna(0.0)
 
 
 def extract_laps(session, race: dict) -> pd.DataFrame:
@@ -103,117 +114,165 @@ def extract_laps(session, race: dict) -> pd.DataFrame:
 
 
 # ── JSON export helpers for the frontend ──────────────────────────────────
+#
+# Exporters build whole columns at once and serialise with DataFrame.to_json;
+# no per-row Python. Every file can also be written pre-compressed (.gz/.br)
+# so a static host can serve it without compressing on each request.
+
+TRACK_EPSILON = 5.0    # max Douglas–Peucker deviation, FastF1 X/Y units (~0.5 m)
+TRACK_MAX_GAP = 150.0  # max spacing between kept points (~15 m); TrackCanvas
+                       # advances cars per point, so straights can't be empty
+
+
+def _col(df: pd.DataFrame, name: str, default) -> pd.Series:
+    """Column ``name`` with missing values (or the whole column) defaulted."""
+    if name in df.columns:
+        return df[name].fillna(default)
+    return pd.Series(default, index=df.index)
+
+
+def _write_json(frame: pd.DataFrame, path: str, indent: int | None = None,
+                compress: tuple = ()) -> int:
+    """Write ``frame`` as a JSON array of records, plus optional .gz/.br."""
+    text = frame.to_json(orient="records", indent=indent, double_precision=3)
+    data = text.encode()
+    with open(path, "wb") as f:
+        f.write(data)
+    if "gzip" in compress:
+        with open(path + ".gz", "wb") as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if "br" in compress:
+        try:
+            import brotli
+        except ImportError:
+            print("  (brotli not installed — skipping .br output)")
+        else:
+            with open(path + ".br", "wb") as f:
+                f.write(brotli.compress(data, quality=11))
+    return len(frame)
+
 
-def _export_weather_json(weather_df, path):
+def _export_weather_json(weather_df, path, compress=()):
     """Convert session.weather_data → weather_data.json"""
-    records = []
-    for _, row in weather_df.iterrows():
-        records.append({
-            "Time": round(_to_seconds(row.get("Time", 0)), 3),
-            "AirTemp": float(row.get("AirTemp", 0)),
-            "Humidity": float(row.get("Humidity", 0)),
-            "Pressure": float(row.get("Pressure", 0)),
-            "Rainfall": bool(row.get("Rainfall", False)),
-            "TrackTemp": float(row.get("TrackTemp", 0)),
-            "WindDirection": int(row.get("WindDirection", 0)),
-            "WindSpeed": float(row.get("WindSpeed", 0)),
-        })
-    with open(path, "w") as f:
-        json.dump(records, f, separators=(",", ":"))
-    return len(records)
-
-
-def _export_race_events_json(rc_df, path):
+    out = pd.DataFrame({
+        "Time": _session_seconds(weather_df["Time"]).round(3),
+        "AirTemp": _col(weather_df, "AirTemp", 0).astype(float),
+        "Humidity": _col(weather_df, "Humidity", 0).astype(float),
+        "Pressure": _col(weather_df, "Pressure", 0).astype(float),
+        "Rainfall": _col(weather_df, "Rainfall", False).astype(bool),
+        "TrackTemp": _col(weather_df, "TrackTemp", 0).astype(float),
+        "WindDirection": _col(weather_df, "WindDirection", 0).astype(int),
+        "WindSpeed": _col(weather_df, "WindSpeed", 0).astype(float),
+    })
+    return _write_json(out, path, compress=compress)
+
+
+def _classify_events(msg_upper: pd.Series, flag: pd.Series,
+                     cat: pd.Series) -> np.ndarray:
+    """Event type per race-control message; first matching rule wins."""
+    def has(series, text):
+        return series.str.contains(text, regex=False)
+
+    rules = [
+        (has(flag, "YELLOW") | has(msg_upper, "YELLOW"), "flag"),
+        (has(msg_upper, "SAFETY") | (cat == "SafetyCar"), "incident"),
+        (has(cat.str.upper(), "INCIDENT") | has(msg_upper, "INVESTIGATION")
+         | has(msg_upper, "PENALTY"), "incident"),
+        (has(msg_upper, "DRS") | has(msg_upper, "BLUE FLAG")
+         | has(msg_upper, "DELETED"), "flag"),
+        (has(msg_upper, "RAIN") | has(msg_upper, "WEATHER"), "weather"),
+        (has(msg_upper, "PIT"), "pit"),
+    ]
+    return np.select([cond.to_numpy() for cond, _ in rules],
+                     [etype for _, etype in rules], default="strategy")
+
+
+def _export_race_events_json(rc_df, path, lap_index, t0_date=None, compress=()):
     """Convert session.race_control_messages → race_events_data.json"""
-    skip_prefixes = ("ROLLING START", "GREEN LIGHT", "CAR", "BLACK AND WHITE")
-    events = []
-    idx = 0
-    for _, row in rc_df.iterrows():
-        msg = str(row.get("Message", "")).strip()
-        if not msg:
+    msg = _col(rc_df, "Message", "").astype(str).str.strip()
+    keep = (msg != "").to_numpy()
+    rc_df, msg = rc_df[keep], msg[keep]
+
+    times = _session_seconds(rc_df["Time"], t0_date).to_numpy()
+    etype = _classify_events(msg.str.upper(),
+                             _col(rc_df, "Flag", "").astype(str),
+                             _col(rc_df, "Category", "").astype(str))
+    out = pd.DataFrame({
+        "id": [f"rc{i}" for i in range(1, len(msg) + 1)],
+        "LapNumber": lap_index.lap_at(times).astype(int),
+        "Time": np.round(times, 3),
+        "type": etype,
+        "description": msg.to_numpy(),
+    })
+    return _write_json(out, path, indent=2, compress=compress)
+
+
+def _export_track_status_json(ts_df, path, lap_index, compress=()):
+    """Convert session.track_status → track_status_data.json"""
+    times = _session_seconds(ts_df["Time"]).to_numpy()
+    out = pd.DataFrame({
+        "Time": np.round(times, 3),
+        "Status": _col(ts_df, "Status", 1).astype(int).to_numpy(),
+        "Message": _col(ts_df, "Message", "AllClear").astype(str).to_numpy(),
+        "Lap": lap_index.lap_at(times).astype(int),
+    })
+    return _write_json(out, path, indent=2, compress=compress)
+
+
+def _douglas_peucker(xy: np.ndarray, epsilon: float) -> np.ndarray:
+    """Boolean mask of points kept by Douglas–Peucker simplification.
+
+    Every dropped point lies within ``epsilon`` of the simplified line, so
+    corners stay dense and straights collapse to a few points. Each split
+    is a vectorised distance computation over the segment.
+    """
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    if n < 3:
+        keep[:] = True
+        return keep
+    keep[[0, n - 1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
             continue
-        msg_upper = msg.upper()
-        if any(msg_upper.startswith(p) for p in skip_prefixes):
-            pass  # keep these — they're informative (deleted laps, flags)
-
-        time_sec = _to_seconds(row.get("Time", 0))
-        lap = max(1, round(time_sec / AVG_LAP_SEC))
-        flag = str(row.get("Flag", ""))
-        cat = str(row.get("Category", ""))
-
-        if "YELLOW" in flag or "YELLOW" in msg_upper:
-            etype = "flag"
-        elif "SAFETY" in msg_upper or cat == "SafetyCar":
-            etype = "incident"
-        elif "INCIDENT" in cat.upper() or "INVESTIGATION" in msg_upper or "PENALTY" in msg_upper:
-            etype = "incident"
-        elif "DRS" in msg_upper or "BLUE FLAG" in msg_upper or "DELETED" in msg_upper:
-            etype = "flag"
-        elif "RAIN" in msg_upper or "WEATHER" in msg_upper:
-            etype = "weather"
-        elif "PIT" in msg_upper:
-            etype = "pit"
+        seg = xy[j] - xy[i]
+        rel = xy[i + 1:j] - xy[i]
+        norm = math.hypot(seg[0], seg[1])
+        if norm == 0.0:  # closed loop: start and end coincide
+            dist = np.hypot(rel[:, 0], rel[:, 1])
         else:
-            etype = "strategy"
-
-        idx += 1
-        events.append({
-            "id": f"rc{idx}",
-            "LapNumber": lap,
-            "Time": round(time_sec, 3),
-            "type": etype,
-            "description": msg,
-        })
-    with open(path, "w") as f:
-        json.dump(events, f, indent=2)
-    return len(events)
-
-
-def _export_track_status_json(ts_df, path):
-    """Convert session.track_status → track_status_data.json"""
-    records = []
-    for _, row in ts_df.iterrows():
-        time_sec = _to_seconds(row.get("Time", 0))
-        records.append({
-            "Time": round(time_sec, 3),
-            "Status": int(row.get("Status", 1)),
-            "Message": str(row.get("Message", "AllClear")),
-            "Lap": max(1, round(time_sec / AVG_LAP_SEC)),
-        })
-    with open(path, "w") as f:
-        json.dump(records, f, indent=2)
-    return len(records)
-
-
-def _export_telemetry_json(session, path):
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / norm
+        k = int(np.argmax(dist))
+        if dist[k] > epsilon:
+            mid = i + 1 + k
+            keep[mid] = True
+            stack.append((i, mid))
+            stack.append((mid, j))
+    return keep
+
+
+def _export_telemetry_json(session, path, epsilon=TRACK_EPSILON,
+                           max_gap=TRACK_MAX_GAP, compress=()):
     """Fastest-lap telemetry → monza.json (track shape with speed)."""
     fastest = session.laps.pick_fastest()
-    telem = fastest.get_telemetry()
-    points = []
-    for _, row in telem.iterrows():
-        x = row.get("X")
-        y = row.get("Y")
-        spd = row.get("Speed", 0)
-        if pd.isna(x) or pd.isna(y):
-            continue
-        points.append({
-            "x": round(float(x), 2),
-            "y": round(float(y), 2),
-            "speed": round(float(spd), 2),
-        })
-
-    # Subsample to ~600-700 points for smooth rendering without bloat
-    total = len(points)
-    if total > 700:
-        step = math.ceil(total / 650)
-        points = [points[i] for i in range(0, total, step)]
-
-    with open(path, "w") as f:
-        json.dump(points, f, indent=2)
-    return len(points)
-
-
-def main():
+    telem = fastest.get_telemetry().dropna(subset=["X", "Y"])
+
+    xy = telem[["X", "Y"]].to_numpy(dtype=float)
+    keep = _douglas_peucker(xy, epsilon)
+    # Error-bounded shape, plus one point per max_gap of arc length
+    arc = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(xy, axis=0).T))))
+    keep |= np.diff(np.floor(arc / max_gap), prepend=-1.0) > 0
+    out = pd.DataFrame({
+        "x": np.round(xy[keep, 0], 2),
+        "y": np.round(xy[keep, 1], 2),
+        "speed": np.round(_col(telem, "Speed", 0).to_numpy(dtype=float)[keep], 2),
+    })
+    return _write_json(out, path, indent=2, compress=compress)
+
+
+def main(compress: tuple = ()):
     os.makedirs(WEB_LIB, exist_ok=True)
     train_frames, test_frames = [], []
 
@@ -235,26 +294,36 @@ def main():
             test_frames.append(df)
 
             # ── Frontend JSON files (saved to web/lib/) ──────────────
+            lap_index = LapIndex.from_laps(session.laps)
+
             n = _export_weather_json(
                 session.weather_data,
-                os.path.join(WEB_LIB, "weather_data.json"))
+                os.path.join(WEB_LIB, "weather_data.json"),
+                compress=compress)
             print(f"  weather_data.json      ({n} samples)")
 
             n = _export_race_events_json(
                 session.race_control_messages,
-                os.path.join(WEB_LIB, "race_events_data.json"))
+                os.path.join(WEB_LIB, "race_events_data.json"),
+                lap_index, session.t0_date, compress=compress)
             print(f"  race_events_data.json  ({n} events)")
 
             n = _export_track_status_json(
                 session.track_status,
-                os.path.join(WEB_LIB, "track_status_data.json"))
+                os.path.join(WEB_LIB, "track_status_data.json"),
+                lap_index, compress=compress)
             print(f"  track_status_data.json ({n} entries)")
 
             n = _export_telemetry_json(
                 session,
-                os.path.join(WEB_LIB, "monza.json"))
+                os.path.join(WEB_LIB, "monza.json"),
+                compress=compress)
             print(f"  monza.json             ({n} points)")
 
+            # ── Full per-car position telemetry (memory-mapped store) ──
+            n = write_store(session, store_path(race["gp"]))
+            print(f"  {store_path(race['gp'])}/  ({n:,} samples, all cars)")
+
     # ── Combine and persist (ML training data stays as CSV) ───────────
     train_df = pd.concat(train_frames, ignore_index=True)
     train_df.to_csv("data/laps_train.csv", index=False)
@@ -270,4 +339,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Download F1 data and export CSV/JSON.")
+    parser.add_argument("--compress", default="",
+                        help="also write pre-compressed JSON: gzip, br or gzip,br")
+    args = parser.parse_args()
+    main(tuple(c.strip() for c in args.compress.split(",") if c.strip()))
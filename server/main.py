@@ -1,45 +1,129 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 import asyncio
+import hmac
 import json
 import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 import requests
 from dotenv import load_dotenv
-from simulator import run_monte_carlo
+import admission
+import bus
+import metrics
+import profiling
+import protocol
+import race_index
+import replay
+import simulator
+import telemetry_store
+from metrics import span
+from simulator import run_monte_carlo, run_undercut
 
 load_dotenv()
 
-app = FastAPI()
+# Cross-worker broadcast backend (APEX_BUS); in-process unless configured
+broadcast_bus = bus.make_bus()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await broadcast_bus.start(manager.deliver_local)
+    yield
+    await broadcast_bus.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure OpenRouter API Key (fallback to GEMINI_API_KEY)
 api_key = os.environ.get("OPENROUTER_API_KEY", os.environ.get("GEMINI_API_KEY", ""))
 
+# Admin messages (e.g. arming the profiler) are refused unless this token
+# is configured and sent with them
+admin_token = os.environ.get("APEX_ADMIN_TOKEN", "")
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: list[WebSocket] = []
+        self.encodings: dict[WebSocket, str] = {}
 
     async def connect(self, websocket: WebSocket):
-        await websocket.accept()
+        encoding, subprotocol = protocol.negotiate(websocket)
+        await websocket.accept(subprotocol=subprotocol)
         self.active_connections.append(websocket)
+        self.encodings[websocket] = encoding
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        self.encodings.pop(websocket, None)
+
+    async def send(self, websocket: WebSocket, message: dict):
+        """Send to one client in its negotiated encoding."""
+        encoding = self.encodings.get(websocket, protocol.JSON)
+        frame = protocol.encode(message, encoding)
+        await protocol.send(websocket, frame)
+        metrics.BYTES_SENT.inc(encoding, len(frame))
 
     async def broadcast(self, message: dict):
-        for connection in self.active_connections:
+        """Publish to every worker's clients through the broadcast bus."""
+        try:
+            await broadcast_bus.publish(message)
+        except Exception as e:
+            print(f"Error publishing broadcast: {e}")
+
+    async def deliver_local(self, message: dict):
+        """Send to the clients connected to this process."""
+        # Serialise once per encoding in use, not once per client
+        frames: dict[str, str | bytes] = {}
+        for connection in list(self.active_connections):
+            encoding = self.encodings.get(connection, protocol.JSON)
+            frame = frames.get(encoding)
+            if frame is None:
+                with span(f"encode_{encoding}"):
+                    frame = frames[encoding] = protocol.encode(message, encoding)
             try:
-                await connection.send_json(message)
+                await protocol.send(connection, frame)
+                metrics.BYTES_SENT.inc(encoding, len(frame))
             except Exception as e:
                 print(f"Error broadcasting to client: {e}")
 
 manager = ConnectionManager()
+metrics.CONNECTED_CLIENTS.set_function(lambda: len(manager.active_connections))
+
+# Radio calls keyed on what the LLM actually formats (event, call, win %),
+# so repeated identical situations skip the 2s OpenRouter round-trip.
+RADIO_CACHE_SIZE = 128
+_radio_cache: OrderedDict = OrderedDict()
+
+
+def template_radio_call(math_results: dict) -> str:
+    """Radio call built from the simulator output alone (degraded mode)."""
+    if "error" in math_results:
+        return "Box box box! We have a strategy error, come in now!"
+    call = math_results.get("recommendation", "")
+    wp = math_results.get("win_probability")
+    return f"{call} Win probability {wp}%." if wp is not None else call
 
 
-async def generate_radio_call(math_results: dict, event: str) -> str:
+async def generate_radio_call(math_results: dict, event: str,
+                              use_llm: bool = True) -> str:
     if not api_key:
         return "OpenRouter API key not found. Simulated Radio: Box box box!"
-        
-    if event == "strategy_update":
+
+    cache_key = (event, math_results.get("recommendation"),
+                 math_results.get("win_probability"))
+    cached = _radio_cache.get(cache_key)
+    if cached is not None:
+        _radio_cache.move_to_end(cache_key)
+        metrics.LLM_CACHE.inc("hit")
+        return cached
+    metrics.LLM_CACHE.inc("miss")
+    if not use_llm:
+        return template_radio_call(math_results)
+
+    if event in ("strategy_update", "undercut"):
         prompt = f"""
         You are a calm, highly analytical F1 Race Engineer.
         We are doing a routine strategy check.
@@ -78,44 +162,191 @@ async def generate_radio_call(math_results: dict, event: str) -> str:
 
     try:
         # Give a 2.0s latency budget for OpenRouter overhead via timeout parameter
-        response_data = await asyncio.to_thread(fetch_openrouter)
-        return response_data['choices'][0]['message']['content'].strip()
+        with span("llm"):
+            response_data = await asyncio.to_thread(fetch_openrouter)
+        radio = response_data['choices'][0]['message']['content'].strip()
+        _radio_cache[cache_key] = radio
+        if len(_radio_cache) > RADIO_CACHE_SIZE:
+            _radio_cache.popitem(last=False)
+        return radio
     except Exception as e:
         print(f"OpenRouter API error/timeout: {e}")
         return "Box box box! We have a strategy error, come in now!"
 
 
-@app.websocket("/ws/chaos")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+def handle_admin(payload: dict) -> dict:
+    """Admin commands sent on /ws/chaos; answered to the sender only."""
+    if not admin_token:
+        return {"admin": payload.get("admin"),
+                "error": "admin commands disabled (APEX_ADMIN_TOKEN not set)"}
+    if not hmac.compare_digest(str(payload.get("token", "")), admin_token):
+        return {"admin": payload.get("admin"), "error": "unauthorized"}
+
+    command = payload.get("admin")
     try:
-        while True:
-            # We expect standard JSON like {"event": "rain", "intensity": "heavy"}
-            data = await websocket.receive_text()
-            try:
-                payload = json.loads(data)
-            except json.JSONDecodeError:
-                payload = {"event": str(data)}
+        if command == "profile":
+            return {"admin": command, "profiler": profiling.arm(
+                int(payload.get("calls", 1)),
+                str(payload.get("mode", "cprofile")))}
+        if command == "profile_status":
+            return {"admin": command, "profiler": profiling.status()}
+        if command == "reload_model":
+            ok = simulator.load_resources()
+            return {"admin": command, "loaded": ok,
+                    "cache": simulator.result_cache_stats()}
+        if command == "cache_stats":
+            return {"admin": command, "cache": simulator.result_cache_stats()}
+        if command == "admission_status":
+            return {"admin": command, "admission": admission.controller.status()}
+    except (TypeError, ValueError) as e:
+        return {"admin": command, "error": str(e)}
+    return {"admin": command, "error": "unknown admin command"}
+
+
+def decode_chaos_message(data: str | bytes) -> dict:
+    """Client frame → payload dict (plain text becomes an event name)."""
+    # We expect standard JSON like {"event": "rain", "intensity": "heavy"}
+    # (or the same object as a MessagePack binary frame)
+    with span("decode"):
+        try:
+            payload = protocol.decode(data)
+        except ValueError:
+            payload = {"event": str(data)}
+    return payload if isinstance(payload, dict) else {"event": str(payload)}
+
 
-            event = payload.get("event", "").lower()
-            print(f"Received chaos event: {event}")
+def _rejection(payload: dict, e: admission.Rejected) -> dict:
+    return {
+        "event": payload.get("event"),
+        "error": e.reason,
+        "retry_after": round(e.retry_after, 2),
+        "mode": admission.controller.mode,
+    }
 
-            current_tire_age = int(payload.get("current_tire_age", 15))
-            compound_str = str(payload.get("compound", "MEDIUM"))
-            laps_left = int(payload.get("laps_left", 30))
-            position = int(payload.get("position", 10))
-            stint = int(payload.get("stint", 1))
-            fresh_tyre = bool(payload.get("fresh_tyre", False))
 
-            air_temp = float(payload.get("air_temp", 25.0))
-            track_temp = float(payload.get("track_temp", 35.0))
-            humidity = float(payload.get("humidity", 50.0))
-            rainfall = int(payload.get("rainfall", 0))
+async def handle_chaos_message(websocket: WebSocket, payload: dict, arrived: float):
+    """Dispatch one admitted message as an admin command or chaos event."""
+    if "admin" in payload:
+        await manager.send(websocket, handle_admin(payload))
+        return
+
+    try:
+        async with admission.controller.slot(arrived) as mode:
+            with profiling.profiled("handler"):
+                await process_chaos_event(payload, mode)
+    except admission.Rejected as e:
+        await manager.send(websocket, _rejection(payload, e))
+
+
+def _undercut(payload: dict, laps_left: int, air_temp: float,
+              track_temp: float, humidity: float, rainfall: int,
+              num_sims: int) -> dict:
+    """Head-to-head grid for an "undercut" payload (defaults already applied).
+
+    ``rival`` is either a state dict (tire_age, compound, position, stint)
+    or, with ``race_time``, a driver code looked up in the replay; ``gap``
+    (seconds the rival is ahead) then defaults to the real gap on the road.
+    """
+    ours = {"tire_age": int(payload["current_tire_age"]),
+            "compound": str(payload["compound"]),
+            "position": int(payload["position"]),
+            "stint": int(payload["stint"]),
+            "new_compound": payload.get("new_compound")}
+    rival = payload["rival"]
+    gap = payload.get("gap")
+    if isinstance(rival, str):
+        timeline = replay.get_timeline()
+        if timeline is None or "race_time" not in payload:
+            return {"error": "Rival by driver code needs race_time and replay data."}
+        try:
+            real = timeline.race_state(rival, float(payload["race_time"]))
+        except KeyError:
+            return {"error": f"unknown rival {rival!r} at this race"}
+        rival = {"tire_age": real["current_tire_age"], "compound": real["compound"],
+                 "position": real["position"], "stint": real["stint"]}
+        if gap is None and "gap_to_leader" in payload and "gap_to_leader" in real:
+            gap = payload["gap_to_leader"] - real["gap_to_leader"]
+    else:
+        rival = {"tire_age": int(rival.get("current_tire_age", rival.get("tire_age", 15))),
+                 "compound": str(rival.get("compound", "MEDIUM")),
+                 "position": int(rival.get("position", 10)),
+                 "stint": int(rival.get("stint", 1)),
+                 "new_compound": rival.get("new_compound")}
+    return run_undercut(ours, rival, float(gap if gap is not None else 1.0),
+                        laps_left, air_temp=air_temp, track_temp=track_temp,
+                        humidity=humidity, rainfall=rainfall,
+                        num_sims=num_sims)
 
-            print(f"  tire_age={current_tire_age}  compound={compound_str}  "
-                  f"laps_left={laps_left}  pos={position}")
 
+def _event_label(event: str) -> str:
+    """Bounded metrics label for a client-supplied event string."""
+    if not event:
+        return "none"
+    if event in ("undercut", "strategy_update"):
+        return event
+    return "+".join(simulator.parse_events(event)) or "other"
+
+
+async def process_chaos_event(payload: dict, mode: str = admission.NORMAL):
+    """Run the simulator + radio call for one chaos payload and broadcast.
+
+    In degraded mode the simulation runs fewer sims (cached full results
+    still win) and the radio call skips the LLM.
+    """
+    degraded = mode == admission.DEGRADED
+    num_sims = admission.DEGRADED_SIMS if degraded else simulator.NUM_SIMS
+    # {"race_time": 2400, "driver": "VER"} fills any missing race state
+    # from the real race at that session time
+    lookup_error = None
+    if "race_time" in payload:
+        timeline = replay.get_timeline()
+        if timeline is not None:
             try:
+                real_state = timeline.race_state(payload.get("driver"),
+                                                 float(payload["race_time"]))
+            except KeyError:
+                lookup_error = f"unknown driver {payload.get('driver')!r} at this race"
+            else:
+                payload = {**real_state, **payload}
+
+    # {"rival": {...} | "LEC", "gap": 1.8} asks for the undercut/overcut
+    # grid against one car instead of the race-win simulation
+    if payload.get("rival") is not None:
+        payload = {**payload, "event": "undercut"}
+
+    # Events can be stacked: "rain+major_crash" or ["rain", "major_crash"]
+    raw_event = payload.get("event", "")
+    if isinstance(raw_event, list):
+        raw_event = "+".join(str(e) for e in raw_event)
+    event = str(raw_event).lower()
+    print(f"Received chaos event: {event}")
+    metrics.REQUESTS.inc(_event_label(event))
+
+    # Same defaults and bounds as POST /api/batch
+    state = {**simulator.SCENARIO_DEFAULTS, **payload}
+    current_tire_age = int(state["current_tire_age"])
+    compound_str = str(state["compound"])
+    laps_left = simulator.clamp_laps_left(state["laps_left"])
+    position = int(state["position"])
+    stint = int(state["stint"])
+    fresh_tyre = bool(state["fresh_tyre"])
+
+    air_temp = float(state["air_temp"])
+    track_temp = float(state["track_temp"])
+    humidity = float(state["humidity"])
+    rainfall = int(state["rainfall"])
+
+    print(f"  tire_age={current_tire_age}  compound={compound_str}  "
+          f"laps_left={laps_left}  pos={position}")
+
+    try:
+        with span("simulate"):
+            if lookup_error is not None:
+                math_out = {"error": lookup_error}
+            elif event == "undercut":
+                math_out = _undercut(state, laps_left, air_temp, track_temp,
+                                     humidity, rainfall, num_sims)
+            else:
                 math_out = run_monte_carlo(
                     current_tire_age=current_tire_age,
                     compound_str=compound_str,
@@ -127,28 +358,263 @@ async def websocket_endpoint(websocket: WebSocket):
                     event=event,
                     position=position,
                     stint=stint,
-                    fresh_tyre=fresh_tyre
+                    fresh_tyre=fresh_tyre,
+                    num_sims=num_sims
                 )
-            except Exception as e:
-                print(f"Simulator error: {e}")
-                math_out = {"error": "Math engine failure"}
-
-            # 2. Generate LLM Script
-            radio_script = await generate_radio_call(math_out, event)
-            
-            # 3. Broadcast Result
-            final_response = {
-                "event": event,
-                "math_results": math_out,
-                "radio_call": radio_script
-            }
-            
-            await manager.broadcast(final_response)
-            
+    except Exception as e:
+        print(f"Simulator error: {e}")
+        math_out = {"error": "Math engine failure"}
+
+    # 2. Generate LLM Script
+    with span("radio_call"):
+        radio_script = await generate_radio_call(math_out, event,
+                                                 use_llm=not degraded)
+
+    # 3. Broadcast Result
+    final_response = {
+        "event": event,
+        "math_results": math_out,
+        "radio_call": radio_script,
+        "mode": mode
+    }
+
+    with span("broadcast"):
+        await manager.broadcast(final_response)
+
+
+async def _read_chaos(websocket: WebSocket, session: admission.Session):
+    """Receive messages as they arrive and admit or reject each at once.
+
+    Runs beside the socket's worker, so the rate limit and backlog bound
+    apply on arrival rather than when the worker gets round to a message.
+    """
+    try:
+        while True:
+            payload = decode_chaos_message(await protocol.receive(websocket))
+            try:
+                session.offer(payload)
+            except admission.Rejected as e:
+                await manager.send(websocket, _rejection(payload, e))
+                continue
+            metrics.INFLIGHT.inc()
     except WebSocketDisconnect:
+        pass
+
+
+async def _serve_chaos(websocket: WebSocket, session: admission.Session):
+    """Handle the socket's admitted messages in order until the None sentinel."""
+    while (item := await session.queue.get()) is not None:
+        payload, arrived = item
+        try:
+            with span("handler"):
+                await handle_chaos_message(websocket, payload, arrived)
+        except Exception as e:
+            print(f"Error handling chaos message: {e}")
+        finally:
+            metrics.INFLIGHT.dec()
+
+
+@app.websocket("/ws/chaos")
+async def websocket_endpoint(websocket: WebSocket):
+    await manager.connect(websocket)
+    session = admission.controller.session(websocket)
+    reader = asyncio.create_task(_read_chaos(websocket, session))
+    worker = asyncio.create_task(_serve_chaos(websocket, session))
+    try:
+        await reader
+        # Client gone: stop sending to it, but still broadcast what it
+        # already had admitted
         manager.disconnect(websocket)
+        await session.queue.put(None)
+        await worker
+    finally:
+        reader.cancel()
+        worker.cancel()
+        while not session.queue.empty():
+            if session.queue.get_nowait() is not None:
+                metrics.INFLIGHT.dec()
+        manager.disconnect(websocket)
+        admission.controller.forget(websocket)
         print("Client disconnected from /ws/chaos")
 
+
+REPLAY_TICK_S = 0.25  # wall-clock seconds between replay frames
+
+
+@app.websocket("/ws/replay")
+async def replay_endpoint(websocket: WebSocket):
+    """Stream the real race as timing-board deltas.
+
+    Query params: ``speed`` (race seconds per wall second, default 1),
+    ``start`` (session time to start from) and ``encoding`` as for /ws/chaos.
+    The first frame is a full snapshot; after that only changed fields.
+    """
+    encoding, subprotocol = protocol.negotiate(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+
+    timeline = replay.get_timeline()
+    if timeline is None:
+        await protocol.send(websocket, protocol.encode(
+            {"type": "error", "error": "replay data not available"}, encoding))
+        await websocket.close()
+        return
+
+    try:
+        speed = float(websocket.query_params.get("speed", 1.0))
+        t = float(websocket.query_params.get("start", timeline.start_time))
+    except ValueError:
+        speed, t = 1.0, timeline.start_time
+    # Replay time must advance, or the loop below never ends nor sends
+    if not (0 < speed < float("inf")):
+        await protocol.send(websocket, protocol.encode(
+            {"type": "error", "error": "speed must be a positive number"}, encoding))
+        await websocket.close()
+        return
+
+    try:
+        board = timeline.state_at(t)
+        await protocol.send(websocket, protocol.encode({
+            "type": "snapshot", "t": round(t, 3),
+            "total_laps": timeline.total_laps,
+            "drivers": timeline.diff(None, board),
+        }, encoding))
+
+        race_control = race_index.race_control()
+        track_status = race_index.track_status()
+        while t < timeline.finish_time:
+            await asyncio.sleep(REPLAY_TICK_S)
+            t_prev, t = t, t + REPLAY_TICK_S * speed
+            new_board = timeline.state_at(t)
+            frame = {"type": "delta", "t": round(t, 3),
+                     "changes": timeline.diff(board, new_board)}
+            board = new_board
+            for key, index in (("race_control", race_control),
+                               ("track_status", track_status)):
+                happened = index.between(t_prev, t)
+                if happened:
+                    frame[key] = happened
+            if len(frame) > 3 or frame["changes"]:
+                await protocol.send(websocket, protocol.encode(frame, encoding))
+
+        await protocol.send(websocket, protocol.encode(
+            {"type": "end", "t": round(t, 3)}, encoding))
+    except WebSocketDisconnect:
+        print("Client disconnected from /ws/replay")
+
+
+@app.get("/api/events")
+def events_between(t0: float = 0.0, t1: float = float("inf")):
+    """Race-control messages and track-status changes with t0 < Time <= t1."""
+    return {
+        "race_control": race_index.race_control().between(t0, t1),
+        "track_status": race_index.track_status().between(t0, t1),
+        "track_status_at_t0": race_index.track_status().latest_at(t0),
+    }
+
+
+TELEMETRY_MAX_ROWS = 10_000  # per driver per response (~35 min of position data)
+
+
+@app.get("/api/telemetry/window")
+def telemetry_window(t0: float, t1: float, drivers: str = "", channels: str = "",
+                     step: int = 1, encoding: str = protocol.JSON):
+    """Every car's position telemetry for t0 <= time <= t1.
+
+    The window is sliced from the memory-mapped store as views, so only the
+    requested rows are read; serialising copies them once (``encoding=msgpack``
+    sends each channel as one raw little-endian buffer instead of JSON lists).
+    More than ``TELEMETRY_MAX_ROWS`` rows for any driver is refused with 413;
+    widen ``step`` or narrow the window.
+    """
+    store = telemetry_store.get_store(replay.REPLAY_GP)
+    if store is None:
+        return Response(status_code=404, content="telemetry store not built")
+    step = max(step, 1)
+    window = store.window(
+        t0, t1,
+        drivers=[d.strip().upper() for d in drivers.split(",") if d.strip()] or None,
+        channels=[c.strip().lower() for c in channels.split(",") if c.strip()] or None,
+        step=step)
+    rows = max((len(cols["time"]) for cols in window.values()), default=0)
+    if rows > TELEMETRY_MAX_ROWS:
+        min_step = -(-rows * step // TELEMETRY_MAX_ROWS)
+        return Response(status_code=413, content=(
+            f"{rows} rows per driver exceeds {TELEMETRY_MAX_ROWS}; "
+            f"use step>={min_step} or a shorter window"))
+    if encoding == protocol.MSGPACK and encoding in protocol.available_encodings():
+        return Response(protocol.encode(window, protocol.MSGPACK),
+                        media_type="application/msgpack")
+    return Response(protocol.encode(window), media_type="application/json")
+
+
+BATCH_CHUNK = 2000            # scenarios per vectorised pass / flush
+BATCH_MAX_SCENARIOS = 200_000
+
+
+@app.post("/api/batch")
+async def batch_scenarios(request: Request):
+    """Evaluate many scenarios offline, streamed back as NDJSON.
+
+    Body: a list of /ws/chaos-style payloads, or
+    ``{"scenarios": [...], "num_sims": 2000}``. Each output line is
+    ``{"index": i, ...math_results}``; the last line is a summary with
+    throughput. No radio calls are generated.
+    """
+    try:
+        body = await request.json()
+    except ValueError:
+        return Response(status_code=400, content="body must be JSON")
+    scenarios = body.get("scenarios") if isinstance(body, dict) else body
+    if not isinstance(scenarios, list):
+        return Response(status_code=400, content="expected a list of scenarios")
+    if len(scenarios) > BATCH_MAX_SCENARIOS:
+        return Response(status_code=413,
+                        content=f"at most {BATCH_MAX_SCENARIOS} scenarios per request")
+    try:
+        num_sims = int(body.get("num_sims", simulator.NUM_SIMS)
+                       if isinstance(body, dict) else simulator.NUM_SIMS)
+    except (TypeError, ValueError):
+        return Response(status_code=400, content="num_sims must be an integer")
+    num_sims = min(max(num_sims, 100), simulator.NUM_SIMS)
+
+    def lines():
+        t0 = time.perf_counter()
+        failed = 0
+        for lo in range(0, len(scenarios), BATCH_CHUNK):
+            with span("batch"):
+                results = simulator.run_scenarios(scenarios[lo:lo + BATCH_CHUNK],
+                                                  num_sims=num_sims)
+            chunk = []
+            for i, result in enumerate(results, start=lo):
+                failed += "error" in result
+                chunk.append(json.dumps({"index": i, **result}))
+            yield "\n".join(chunk) + "\n"
+        elapsed = time.perf_counter() - t0
+        metrics.BATCH_SCENARIOS.inc(amount=len(scenarios))
+        yield json.dumps({"summary": {
+            "scenarios": len(scenarios),
+            "failed": failed,
+            "num_sims": num_sims,
+            "seconds": round(elapsed, 3),
+            "scenarios_per_sec": round(len(scenarios) / max(elapsed, 1e-9), 1),
+        }}) + "\n"
+
+    # Sync generator: Starlette iterates it in a worker thread, so the
+    # simulation never blocks the event loop serving /ws/chaos
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape target: stage latency histograms, clients, cache."""
+    return PlainTextResponse(metrics.render(),
+                             media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    # Several workers need a shared APEX_BUS so broadcasts reach every client
+    workers = int(os.environ.get("APEX_WORKERS", "1"))
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=workers == 1,
+                workers=workers,
+                ws_per_message_deflate=os.environ.get("APEX_WS_DEFLATE", "1") != "0")
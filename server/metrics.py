@@ -0,0 +1,213 @@
+"""
+metrics.py
+----------
+Low-overhead in-process metrics with a Prometheus text exposition.
+
+Hot paths wrap work in ``span("stage")``; each span is two
+``perf_counter()`` calls plus a bisect into fixed histogram buckets, so it
+is cheap enough to leave on in production. ``render()`` produces the
+Prometheus text format served by ``GET /metrics`` in main.py.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds. Covers sub-millisecond parsing up to the 2s LLM timeout.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+
+_registry: list = []
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    """Label value escaping per the Prometheus text format."""
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+def _labels(pairs: dict) -> str:
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items())
+    return "{" + inner + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a single label value."""
+
+    def __init__(self, name: str, help_text: str, label: str = "stage",
+                 buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series: dict[str, list] = {}   # value -> [counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, label_value: str, seconds: float):
+        idx = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 3)
+            series[idx] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(s)) for k, s in self._series.items())
+        for value, series in items:
+            cumulative = 0
+            for i, bound in enumerate(self.buckets + (float("inf"),)):
+                cumulative += series[i]
+                lbl = _labels({self.label: value, "le": _fmt(bound)})
+                lines.append(f"{self.name}_bucket{lbl} {cumulative}")
+            lbl = _labels({self.label: value})
+            lines.append(f"{self.name}_sum{lbl} {_fmt(series[-2])}")
+            lines.append(f"{self.name}_count{lbl} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, optionally split by one label."""
+
+    def __init__(self, name: str, help_text: str, label: str | None = None):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self._values: dict[str, float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, label_value: str = "", amount: float = 1.0):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0.0) + amount
+
+    def value(self, label_value: str = "") -> float:
+        return self._values.get(label_value, 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for value, total in items:
+            lbl = _labels({self.label: value}) if self.label else ""
+            lines.append(f"{self.name}{lbl} {_fmt(total)}")
+        return lines
+
+
+class Gauge:
+    """Point-in-time value, either set directly or read from a callback."""
+
+    def __init__(self, name: str, help_text: str, func=None):
+        self.name = name
+        self.help = help_text
+        self._func = func
+        self._value = 0.0
+        _registry.append(self)
+
+    def set(self, value: float):
+        self._value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self._value -= amount
+
+    def set_function(self, func):
+        self._func = func
+
+    def value(self) -> float:
+        if self._func is not None:
+            try:
+                return float(self._func())
+            except Exception:
+                return float("nan")
+        return self._value
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}",
+                f"# TYPE {self.name} gauge",
+                f"{self.name} {_fmt(self.value())}"]
+
+
+# ── Apex metrics ──────────────────────────────────────────────────────────
+
+STAGE_SECONDS = Histogram(
+    "apex_stage_seconds",
+    "Wall time spent per hot-path stage.")
+REQUESTS = Counter(
+    "apex_requests_total",
+    "Chaos/strategy requests handled, by event.", label="event")
+INFLIGHT = Gauge(
+    "apex_inflight_requests",
+    "Requests received but not yet broadcast (handler queue depth).")
+CONNECTED_CLIENTS = Gauge(
+    "apex_connected_clients",
+    "WebSocket clients currently connected to /ws/chaos.")
+BYTES_SENT = Counter(
+    "apex_ws_bytes_sent_total",
+    "Payload bytes sent to WebSocket clients, by encoding.", label="encoding")
+LLM_CACHE = Counter(
+    "apex_llm_cache_total",
+    "Radio call cache lookups, by result.", label="result")
+LLM_CACHE_HIT_RATE = Gauge(
+    "apex_llm_cache_hit_ratio",
+    "Fraction of radio call lookups served from cache.",
+    func=lambda: LLM_CACHE.value("hit") / max(
+        LLM_CACHE.value("hit") + LLM_CACHE.value("miss"), 1.0))
+
+SIM_CACHE = Counter(
+    "apex_sim_cache_total",
+    "run_monte_carlo result cache lookups, by result.", label="result")
+SIM_CACHE_HIT_RATE = Gauge(
+    "apex_sim_cache_hit_ratio",
+    "Fraction of run_monte_carlo calls served from the result cache.",
+    func=lambda: SIM_CACHE.value("hit") / max(
+        SIM_CACHE.value("hit") + SIM_CACHE.value("miss"), 1.0))
+SIM_CACHE_SIZE = Gauge(
+    "apex_sim_cache_entries",
+    "Entries currently held in the run_monte_carlo result cache.")
+
+BATCH_SCENARIOS = Counter(
+    "apex_batch_scenarios_total",
+    "Scenarios evaluated through POST /api/batch.")
+ADMISSION = Counter(
+    "apex_admission_total",
+    "Chaos messages by admission result (admitted, rate_limited, backlog_full, overloaded).",
+    label="result")
+DEGRADED = Gauge(
+    "apex_degraded_mode",
+    "1 while the server is in degraded mode (fewer sims, no LLM), else 0.")
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block into ``apex_stage_seconds{stage=...}``."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(stage, time.perf_counter() - t0)
+
+
+def render() -> str:
+    """Prometheus text exposition of every registered metric."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
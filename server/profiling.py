@@ -0,0 +1,180 @@
+"""
+profiling.py
+------------
+Opt-in, runtime-toggleable profiler for live simulation requests.
+
+Arm it for the next N calls, either at startup (``APEX_PROFILE_CALLS=N``,
+optional ``APEX_PROFILE_MODE``) or at runtime with an admin message on
+/ws/chaos:
+
+    {"admin": "profile", "calls": 5, "mode": "sample", "token": "..."}
+
+(admin messages are only accepted when ``APEX_ADMIN_TOKEN`` is set).
+
+Each captured call (the /ws/chaos handler, or ``run_monte_carlo`` when it is
+called outside a handler) is written to ``PROFILE_DIR``:
+
+    cprofile  → <stamp>_<name>.prof    pstats file (snakeviz, flameprof)
+    sample    → <stamp>_<name>.folded  folded stacks (flamegraph.pl, speedscope)
+
+When nothing is armed, ``profiled()`` returns a shared no-op context manager
+and ``profile_calls`` wrappers fall straight through, so the cost when off
+is one integer check.
+"""
+
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_DIR = os.environ.get("APEX_PROFILE_DIR", "profiles")
+MODES = ("cprofile", "sample")
+SAMPLE_INTERVAL_S = 0.001
+
+_lock = threading.Lock()
+_remaining = 0
+_mode = "cprofile"
+_active = False
+_written: list[str] = []
+
+
+class _NoProfile:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NoProfile()
+
+
+class _Sampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                             f":{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class _Capture:
+    """Profiles one call and writes the result to PROFILE_DIR on exit."""
+
+    def __init__(self, name: str, mode: str):
+        self.name = name
+        self.mode = mode
+        self._profiler = None
+        self._sampler = None
+
+    def __enter__(self):
+        if self.mode == "sample":
+            self._sampler = _Sampler(threading.get_ident(), SAMPLE_INTERVAL_S)
+            self._sampler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        try:
+            stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() % 10**9:09d}"
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            if self._profiler is not None:
+                self._profiler.disable()
+                path = os.path.join(PROFILE_DIR, f"{stamp}_{self.name}.prof")
+                self._profiler.dump_stats(path)
+            else:
+                self._sampler.stop()
+                path = os.path.join(PROFILE_DIR, f"{stamp}_{self.name}.folded")
+                with open(path, "w") as f:
+                    for stack, count in self._sampler.stacks.most_common():
+                        f.write(f"{stack} {count}\n")
+            _written.append(path)
+            print(f"Profile written → {path}")
+        except Exception as e:
+            print(f"Profiler error: {e}")
+        finally:
+            _active = False
+        return False
+
+
+def arm(calls: int, mode: str = "cprofile") -> dict:
+    """Capture the next ``calls`` profiled calls (0 disarms)."""
+    global _remaining, _mode
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got '{mode}'")
+    with _lock:
+        _remaining = max(0, int(calls))
+        _mode = mode
+    print(f"Profiler armed: {_remaining} call(s), mode={mode}")
+    return status()
+
+
+def status() -> dict:
+    return {
+        "remaining": _remaining,
+        "mode": _mode,
+        "active": _active,
+        "dir": PROFILE_DIR,
+        "written": _written[-10:],
+    }
+
+
+def profiled(name: str):
+    """Context manager profiling the block if a capture is armed.
+
+    Nested calls inside an active capture are not captured separately, so
+    the handler's profile already contains its ``run_monte_carlo`` call.
+    """
+    global _remaining, _active
+    if not _remaining or _active:
+        return _NULL
+    with _lock:
+        if not _remaining or _active:
+            return _NULL
+        _remaining -= 1
+        _active = True
+    return _Capture(name, _mode)
+
+
+def profile_calls(name: str):
+    """Decorator form of ``profiled`` for synchronous functions."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _remaining or _active:
+                return fn(*args, **kwargs)
+            with profiled(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+if os.environ.get("APEX_PROFILE_CALLS"):
+    arm(int(os.environ["APEX_PROFILE_CALLS"]),
+        os.environ.get("APEX_PROFILE_MODE", "cprofile"))
@@ -0,0 +1,128 @@
+"""
+protocol.py
+-----------
+Wire encodings for /ws/chaos.
+
+JSON text frames stay the default. A client can negotiate compact binary
+MessagePack frames either with the WebSocket subprotocol ``apex.msgpack``
+or the query string ``?encoding=msgpack``:
+
+    new WebSocket("ws://host:8000/ws/chaos", ["apex.msgpack"])
+
+In MessagePack frames NumPy arrays are sent as raw little-endian buffers:
+
+    {"__ndarray__": true, "dtype": "<f8", "shape": [20], "data": <bin>}
+
+which a JS client views directly as ``new Float64Array(data.buffer)``. In
+JSON they fall back to nested lists. Transport compression is the standard
+permessage-deflate extension, negotiated by uvicorn (``APEX_WS_DEFLATE``).
+
+``msgpack`` is optional; without it every client is served JSON.
+"""
+
+import json
+
+import numpy as np
+from fastapi import WebSocket, WebSocketDisconnect
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+SUBPROTOCOLS = {"apex.msgpack": MSGPACK, "apex.json": JSON}
+
+
+def available_encodings() -> tuple[str, ...]:
+    return (JSON, MSGPACK) if msgpack is not None else (JSON,)
+
+
+def negotiate(websocket: WebSocket) -> tuple[str, str | None]:
+    """Pick the encoding for a connecting client.
+
+    Returns ``(encoding, subprotocol)``; ``subprotocol`` must be echoed back
+    in ``websocket.accept`` when the client offered one we support.
+    """
+    for offered in websocket.scope.get("subprotocols", []):
+        encoding = SUBPROTOCOLS.get(offered)
+        if encoding in available_encodings():
+            return encoding, offered
+    requested = websocket.query_params.get("encoding", JSON).lower()
+    if requested in available_encodings():
+        return requested, None
+    return JSON, None
+
+
+def _to_wire(obj):
+    """msgpack ``default`` hook: NumPy values → msgpack-native types."""
+    if isinstance(obj, np.ndarray):
+        arr = np.ascontiguousarray(obj)
+        arr = arr.astype(arr.dtype.newbyteorder("<"), copy=False)
+        return {"__ndarray__": True, "dtype": arr.dtype.str,
+                "shape": list(arr.shape), "data": arr.tobytes()}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Cannot encode {type(obj).__name__}")
+
+
+def _to_json(obj):
+    """json ``default`` hook: NumPy values → lists / Python scalars."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Cannot encode {type(obj).__name__}")
+
+
+def _from_wire(obj: dict):
+    if obj.get("__ndarray__"):
+        return np.frombuffer(obj["data"], dtype=np.dtype(obj["dtype"])
+                             ).reshape(obj["shape"])
+    return obj
+
+
+def encode(message: dict, encoding: str = JSON) -> str | bytes:
+    """Serialise ``message`` once; the result is sent as-is to every client."""
+    if encoding == MSGPACK:
+        return msgpack.packb(message, default=_to_wire, use_bin_type=True)
+    return json.dumps(message, default=_to_json, separators=(",", ":"))
+
+
+def decode(data: str | bytes) -> dict:
+    """Parse an incoming frame: text is JSON, binary is MessagePack.
+
+    Raises ``ValueError`` on malformed input (``json.JSONDecodeError`` is a
+    subclass).
+    """
+    if isinstance(data, (bytes, bytearray)):
+        if msgpack is None:
+            raise ValueError("binary frames need the msgpack package")
+        try:
+            payload = msgpack.unpackb(data, object_hook=_from_wire, raw=False)
+        except Exception as e:
+            raise ValueError(f"invalid msgpack frame: {e}") from e
+    else:
+        payload = json.loads(data)
+    if not isinstance(payload, dict):
+        raise ValueError("payload must be an object")
+    return payload
+
+
+async def receive(websocket: WebSocket) -> str | bytes:
+    """Receive one text or binary frame."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("text") is not None:
+        return message["text"]
+    return message.get("bytes") or b""
+
+
+async def send(websocket: WebSocket, frame: str | bytes):
+    """Send a pre-encoded frame as text or binary as appropriate."""
+    if isinstance(frame, str):
+        await websocket.send_text(frame)
+    else:
+        await websocket.send_bytes(frame)
@@ -0,0 +1,110 @@
+"""
+race_index.py
+-------------
+Time-indexed lookups over a race session.
+
+LapIndex    sorted lap-boundary index built from the leader's real lap start
+            times; maps any array of session times to lap numbers with one
+            ``np.searchsorted`` (safety cars and rain laps included, unlike a
+            fixed average lap time).
+EventIndex  race-control messages / track-status changes sorted by session
+            time; ``between(t0, t1)`` answers "what happened in this window"
+            in O(log n + k).
+
+get_f1_data.py uses LapIndex to label exported events with laps; the replay
+and simulator load the exported JSON back into EventIndex at runtime.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+WEB_LIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web", "lib")
+RACE_EVENTS_JSON = os.path.join(WEB_LIB, "race_events_data.json")
+TRACK_STATUS_JSON = os.path.join(WEB_LIB, "track_status_data.json")
+
+
+class LapIndex:
+    """Lap boundaries in session seconds: ``starts[i]`` is when lap i+1 began."""
+
+    def __init__(self, lap_starts):
+        self.starts = np.sort(np.asarray(lap_starts, dtype=float))
+
+    @classmethod
+    def from_laps(cls, laps: pd.DataFrame, time_col: str = "LapStartTime"):
+        """Build from a laps frame; each lap starts when its first car starts it.
+
+        ``time_col`` may be timedelta or float seconds.
+        """
+        times = laps[time_col]
+        if pd.api.types.is_timedelta64_dtype(times):
+            times = times.dt.total_seconds()
+        starts = (pd.DataFrame({"LapNumber": laps["LapNumber"], "t": times})
+                  .dropna()
+                  .groupby("LapNumber")["t"].min()
+                  .sort_index())
+        # The leader's start times are monotonic; guard against bad rows
+        return cls(np.maximum.accumulate(starts.to_numpy()))
+
+    @property
+    def total_laps(self) -> int:
+        return len(self.starts)
+
+    def lap_at(self, times) -> np.ndarray:
+        """Lap number (1-based) in progress at each session time."""
+        laps = np.searchsorted(self.starts, np.asarray(times, dtype=float),
+                               side="right")
+        return np.clip(laps, 1, max(self.total_laps, 1))
+
+
+class EventIndex:
+    """Records sorted by session time with O(log n) window queries."""
+
+    def __init__(self, records: list[dict], time_key: str = "Time"):
+        times = np.array([float(r.get(time_key, 0.0)) for r in records])
+        order = np.argsort(times, kind="stable")
+        self.times = times[order]
+        self.records = [records[i] for i in order]
+
+    @classmethod
+    def from_json(cls, path: str, time_key: str = "Time"):
+        if not os.path.exists(path):
+            return cls([], time_key)
+        with open(path) as f:
+            return cls(json.load(f), time_key)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def between(self, t0: float, t1: float) -> list[dict]:
+        """Records with ``t0 < Time <= t1`` (half-open, so ticks never overlap)."""
+        lo = np.searchsorted(self.times, t0, side="right")
+        hi = np.searchsorted(self.times, t1, side="right")
+        return self.records[lo:hi]
+
+    def latest_at(self, t: float) -> dict | None:
+        """Most recent record at or before ``t`` (e.g. current track status)."""
+        i = np.searchsorted(self.times, t, side="right")
+        return self.records[i - 1] if i else None
+
+
+_race_control = None
+_track_status = None
+
+
+def race_control() -> EventIndex:
+    """Race-control messages exported by get_f1_data.py (loaded once)."""
+    global _race_control
+    if _race_control is None:
+        _race_control = EventIndex.from_json(RACE_EVENTS_JSON)
+    return _race_control
+
+
+def track_status() -> EventIndex:
+    """Track-status changes exported by get_f1_data.py (loaded once)."""
+    global _track_status
+    if _track_status is None:
+        _track_status = EventIndex.from_json(TRACK_STATUS_JSON)
+    return _track_status
@@ -0,0 +1,253 @@
+"""
+replay.py
+---------
+Server-side race replay engine driven by the real per-lap FastF1 data.
+
+``RaceTimeline`` turns the laps CSV for one GP into dense (driver × lap)
+NumPy arrays: lap completion time, lap/sector times, compound, tyre life,
+stint and pit stops. ``state_at(t)`` answers "what does the timing board
+show at session time t" with a handful of vectorised ops, and
+``diff(prev, cur)`` reduces two boards to only the fields that changed, so
+/ws/replay streams small deltas instead of full snapshots.
+
+The same timeline feeds the simulator: ``race_state(driver, t)`` returns
+the real tyre age, compound, position, laps left, weather and track status
+at time t in the payload shape /ws/chaos already accepts.
+"""
+
+from functools import lru_cache
+import os
+
+import numpy as np
+import pandas as pd
+
+import race_index
+
+LAPS_CSV = "data/laps_test.csv"
+REPLAY_GP = "Italy"
+
+# Board fields streamed to clients, named like web/lib/timing_data.json
+FLOAT_FIELDS = ("GapToLeader", "IntervalToAhead", "LastLapTime",
+                "BestLapTime", "Sector1Time", "Sector2Time", "Sector3Time")
+INT_FIELDS = ("Position", "Lap", "LapsDown", "TyreLife", "Stint", "PitCount")
+STR_FIELDS = ("Compound", "Status")
+
+
+def _matrix(df: pd.DataFrame, col: str, drivers, n_laps: int, fill=np.nan):
+    """Pivot one lap column into a (driver, lap) array."""
+    if col not in df.columns:
+        return np.full((len(drivers), n_laps), fill,
+                       dtype=object if isinstance(fill, str) else float)
+    wide = df.pivot_table(index="Driver", columns="LapNumber", values=col,
+                          aggfunc="first")
+    wide = wide.reindex(index=drivers, columns=range(1, n_laps + 1))
+    if isinstance(fill, str):
+        return wide.fillna(fill).to_numpy(dtype=object)
+    return wide.to_numpy(dtype=float)
+
+
+class RaceTimeline:
+    """Time-indexed array store of every driver's laps for one race."""
+
+    def __init__(self, laps: pd.DataFrame):
+        laps = laps.dropna(subset=["Driver", "LapNumber"]).copy()
+        laps["LapNumber"] = laps["LapNumber"].astype(int)
+
+        self.drivers = np.array(sorted(laps["Driver"].astype(str).unique()))
+        self.total_laps = int(laps["LapNumber"].max())
+        D, L = len(self.drivers), self.total_laps
+
+        lap_time = _matrix(laps, "LapTime", self.drivers, L)
+        self.sectors = np.stack([_matrix(laps, f"Sector{i}Time", self.drivers, L)
+                                 for i in (1, 2, 3)], axis=-1)
+        self.compound = _matrix(laps, "Compound", self.drivers, L, fill="UNKNOWN")
+        self.tyre_life = _matrix(laps, "TyreLife", self.drivers, L)
+        self.stint = _matrix(laps, "Stint", self.drivers, L)
+        pit_in = ~np.isnan(_matrix(laps, "PitInTime", self.drivers, L))
+        self.pit_count = np.cumsum(pit_in, axis=1)
+
+        # Laps a driver actually started; everything after retirement is inf
+        last_lap = laps.groupby("Driver")["LapNumber"].max().reindex(self.drivers)
+        ran = np.arange(1, L + 1)[None, :] <= last_lap.to_numpy()[:, None]
+
+        # Lap completion times: the real session "Time" where exported,
+        # otherwise race start + cumulative lap times (missing laps → median)
+        start = 0.0
+        if "LapStartTime" in laps.columns:
+            first = laps.loc[laps["LapNumber"] == 1, "LapStartTime"].dropna()
+            if len(first):
+                start = float(first.min())
+        med = np.nanmedian(lap_time, axis=1)
+        med = np.where(np.isnan(med), np.nanmedian(lap_time), med)
+        filled = np.where(np.isnan(lap_time), med[:, None], lap_time)
+        end_time = start + np.cumsum(filled, axis=1)
+        real_end = _matrix(laps, "Time", self.drivers, L)
+        end_time = np.where(np.isnan(real_end), end_time, real_end)
+
+        self.start_time = start
+        self.end_time = np.where(ran, end_time, np.inf)
+        self.lap_time = np.where(ran, lap_time, np.nan)
+        self.best_lap = np.fmin.accumulate(
+            np.where(np.isnan(self.lap_time), np.inf, self.lap_time), axis=1)
+        self.finish_time = float(np.max(self.end_time[np.isfinite(self.end_time)]))
+
+        # A driver whose last crossing comes before the winner's finish
+        # retired; anyone else short of full distance was lapped and finished
+        self.last_crossing = self.end_time[np.arange(D), last_lap.to_numpy() - 1]
+        winner_finish = float(np.min(self.end_time[:, L - 1]))
+        self.retired = self.last_crossing < winner_finish
+
+        weather = [c for c in ("AirTemp", "TrackTemp", "Humidity", "Rainfall")
+                   if c in laps.columns]
+        self.weather = (laps.dropna(subset=["Time"]).sort_values("Time")
+                        [["Time"] + weather].reset_index(drop=True)
+                        if "Time" in laps.columns and weather else None)
+
+    @classmethod
+    def from_csv(cls, path: str = LAPS_CSV, gp: str = REPLAY_GP):
+        df = pd.read_csv(path)
+        if "GP" in df.columns:
+            df = df[df["GP"] == gp]
+        return cls(df)
+
+    # ── Board state ───────────────────────────────────────────────────────
+
+    def state_at(self, t: float) -> dict:
+        """Timing board at session time ``t`` as columnar arrays.
+
+        Rows are in ``self.drivers`` order; ``Position`` gives the order.
+        """
+        D = len(self.drivers)
+        rows = np.arange(D)
+        completed = np.sum(self.end_time <= t, axis=1)
+        idx = np.maximum(completed - 1, 0)
+        has_lap = completed > 0
+        last_cross = np.where(has_lap, self.end_time[rows, idx], self.start_time)
+
+        done = t >= self.last_crossing
+        out = done & self.retired
+
+        # Running cars first, then more laps, then whoever crossed earlier
+        order = np.lexsort((last_cross, -completed, out))
+        position = np.empty(D, dtype=int)
+        position[order] = np.arange(1, D + 1)
+
+        # Gaps are measured at the line, against the time the leader (or
+        # the car ahead) crossed it on the same lap
+        leader = order[0]
+        leader_laps = completed[leader]
+        ahead = np.empty(D, dtype=int)
+        ahead[order] = np.concatenate(([leader], order[:-1]))
+        gap = np.where(has_lap, last_cross - self.end_time[leader, idx], 0.0)
+        interval = np.where(has_lap, last_cross - self.end_time[ahead, idx], 0.0)
+        gap = np.where(out | ~np.isfinite(gap), np.nan, gap)
+        interval = np.where(out | ~np.isfinite(interval), np.nan, interval)
+
+        def at(arr, fill):
+            return np.where(has_lap, arr[rows, idx], fill)
+
+        status = np.full(D, "RACING", dtype=object)
+        status[out] = "OUT"
+        status[done & ~self.retired] = "FINISHED"
+        return {
+            "Position": position,
+            "Lap": completed,
+            "LapsDown": leader_laps - completed,
+            "GapToLeader": np.round(gap, 3),
+            "IntervalToAhead": np.round(interval, 3),
+            "LastLapTime": np.round(at(self.lap_time, np.nan), 3),
+            "BestLapTime": np.round(np.where(has_lap & np.isfinite(self.best_lap[rows, idx]),
+                                             self.best_lap[rows, idx], np.nan), 3),
+            "Sector1Time": np.round(at(self.sectors[..., 0], np.nan), 3),
+            "Sector2Time": np.round(at(self.sectors[..., 1], np.nan), 3),
+            "Sector3Time": np.round(at(self.sectors[..., 2], np.nan), 3),
+            "Compound": np.where(has_lap, self.compound[rows, idx], self.compound[:, 0]),
+            "TyreLife": np.nan_to_num(at(self.tyre_life, 0.0)).astype(int),
+            "Stint": np.nan_to_num(at(self.stint, 1.0), nan=1.0).astype(int),
+            "PitCount": np.where(has_lap, self.pit_count[rows, idx], 0),
+            "Status": status,
+        }
+
+    def diff(self, prev: dict | None, cur: dict) -> dict:
+        """Only the fields that changed between two boards, per driver.
+
+        ``prev=None`` returns every field (the /ws/replay snapshot frame).
+        """
+        changes: dict[str, dict] = {}
+        for field, values in cur.items():
+            if prev is None:
+                changed = np.ones(len(values), dtype=bool)
+            elif field in FLOAT_FIELDS:
+                old = prev[field]
+                changed = ~((values == old) | (np.isnan(values) & np.isnan(old)))
+            else:
+                changed = values != prev[field]
+            for i in np.flatnonzero(changed):
+                value = values[i]
+                if field in FLOAT_FIELDS:
+                    value = None if np.isnan(value) else float(value)
+                elif field in INT_FIELDS:
+                    value = int(value)
+                else:
+                    value = str(value)
+                changes.setdefault(str(self.drivers[i]), {})[field] = value
+        return changes
+
+    # ── Simulator bridge ──────────────────────────────────────────────────
+
+    def race_state(self, driver: str | None, t: float) -> dict:
+        """Real race state for ``driver`` at ``t`` in /ws/chaos payload keys.
+
+        ``driver=None`` picks the race leader; an unknown driver code raises
+        ``KeyError``.
+        """
+        board = self.state_at(t)
+        if driver is None:
+            i = int(np.argmin(board["Position"]))
+        else:
+            match = np.flatnonzero(self.drivers == str(driver).upper())
+            if not len(match):
+                raise KeyError(driver)
+            i = int(match[0])
+        lap = int(board["Lap"][i])
+        state = {
+            "driver": str(self.drivers[i]),
+            "current_tire_age": int(board["TyreLife"][i]),
+            "compound": str(board["Compound"][i]),
+            "laps_left": max(self.total_laps - lap, 1),
+            "position": int(board["Position"][i]),
+            "stint": int(board["Stint"][i]),
+            "fresh_tyre": bool(board["TyreLife"][i] <= 1),
+        }
+        if np.isfinite(board["GapToLeader"][i]):
+            state["gap_to_leader"] = float(board["GapToLeader"][i])
+        status = race_index.track_status().latest_at(t)
+        if status is not None:
+            state["track_status"] = status.get("Message")
+        if self.weather is not None and len(self.weather):
+            j = int(np.clip(np.searchsorted(self.weather["Time"].to_numpy(), t, side="right") - 1,
+                            0, len(self.weather) - 1))
+            w = self.weather.iloc[j]
+            for src, key in (("AirTemp", "air_temp"), ("TrackTemp", "track_temp"),
+                             ("Humidity", "humidity")):
+                if src in w and not pd.isna(w[src]):
+                    state[key] = float(w[src])
+            if "Rainfall" in w and not pd.isna(w["Rainfall"]):
+                state["rainfall"] = int(bool(w["Rainfall"]))
+        return state
+
+
+@lru_cache(maxsize=4)
+def _load(path: str, gp: str) -> RaceTimeline:
+    timeline = RaceTimeline.from_csv(path, gp)
+    print(f"Replay timeline: {gp} — {len(timeline.drivers)} drivers, "
+          f"{timeline.total_laps} laps")
+    return timeline
+
+
+def get_timeline(path: str = LAPS_CSV, gp: str = REPLAY_GP) -> RaceTimeline | None:
+    """Cached timeline for ``gp``, or None if the laps CSV is missing."""
+    if not os.path.exists(path):
+        print(f"Warning: {path} not found — run get_f1_data.py for replay")
+        return None
+    return _load(path, gp)
@@ -11,21 +11,33 @@ Stage 2: XGBoost predicts the residual (how much faster/slower than base)
 Final lap time = Stage1_base + Stage2_residual
 
 All 10,000 simulations run in pure NumPy — zero for-loops in the math.
+Chaos events are declared in the ``EVENTS`` registry and can be stacked
+(e.g. ``"rain+major_crash"``); their effects are composed into a single
+precomputed offset array before the simulation runs.
 """
 
 import json
 import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable
 
 import joblib
 import numpy as np
 import pandas as pd
 
+import metrics
+from metrics import span
+from profiling import profile_calls
+
 # ── Model artifacts ───────────────────────────────────────────────────────
 poly_tf = None
 pace_ridge = None
 xgb_model = None
 preprocessor = None
 feature_cols = None
+MODEL_VERSION = 0   # bumped on every successful load_resources()
 
 # Monza constants
 MONZA_TRACK_KM = 5.793
@@ -33,9 +45,13 @@ MONZA_CORNERS = 11
 MONZA_TOTAL_LAPS = 53
 MONZA_EST_PACE = None  # computed from pace model on load
 
+NUM_SIMS = 10_000
+LAP_NOISE_SD = 0.5  # s, per-lap Gaussian noise
+
 
 def load_resources():
     global poly_tf, pace_ridge, xgb_model, preprocessor, feature_cols, MONZA_EST_PACE
+    global MODEL_VERSION
     try:
         for path in ("models/pace_model_v2.joblib",
                      "models/engine_v2.joblib",
@@ -58,12 +74,48 @@ def load_resources():
             with open("models/feature_columns_v2.json") as f:
                 feature_cols = json.load(f)
 
+        MODEL_VERSION += 1
+        clear_result_cache()
         return True
     except Exception as e:
         print(f"Error loading resources: {e}")
         return False
 
 
+# ── Result cache ──────────────────────────────────────────────────────────
+# Pit-wall strategy polls repeat the same race state for most of a stint.
+# run_monte_carlo results are kept in an LRU keyed on the quantized state
+# plus MODEL_VERSION; load_resources() empties it so a reloaded model never
+# serves stale answers. Entries remember how many sims produced them, so a
+# full-accuracy result also serves degraded (fewer-sim) requests but not
+# the other way round.
+
+RESULT_CACHE_SIZE = 1024
+_result_cache: OrderedDict = OrderedDict()
+metrics.SIM_CACHE_SIZE.set_function(lambda: len(_result_cache))
+
+
+def quantize_state(tire_age, compound, laps_left, air_temp, track_temp,
+                   humidity, rainfall, events, position, stint, fresh_tyre) -> tuple:
+    """Cache key: ints stay exact, temperatures to 1 °C, humidity to 5 %."""
+    return (MODEL_VERSION, int(tire_age), str(compound).upper(), int(laps_left),
+            int(round(air_temp)), int(round(track_temp)),
+            int(5 * round(humidity / 5)), int(bool(rainfall)), events,
+            int(position), int(stint), bool(fresh_tyre))
+
+
+def clear_result_cache():
+    _result_cache.clear()
+
+
+def result_cache_stats() -> dict:
+    hits, misses = metrics.SIM_CACHE.value("hit"), metrics.SIM_CACHE.value("miss")
+    return {"entries": len(_result_cache), "max_entries": RESULT_CACHE_SIZE,
+            "hits": int(hits), "misses": int(misses),
+            "hit_rate": round(hits / max(hits + misses, 1.0), 3),
+            "model_version": MODEL_VERSION}
+
+
 load_resources()
 
 
@@ -95,8 +147,126 @@ def _build_input_row(tire_age: int,
     }])
 
 
+# ── Chaos event registry ──────────────────────────────────────────────────
+#
+# Every chaos event is declared once as data. Active events are composed into
+# a per-lap offset array (ours and the pack's) plus a flat total penalty, so
+# the Monte Carlo hot path is a single broadcast add regardless of how many
+# events are stacked.
+
+BASE_DEG_RATE = 0.1   # s/lap of tyre degradation with no events active
+PACK_MARGIN = 2.0     # s we must beat the pack's nominal race time by
+
+
+@dataclass(frozen=True)
+class ChaosEvent:
+    """Declarative effect of one chaos event on the simulation.
+
+    ``opening_laps``/``opening_sec`` add time to the first N remaining laps
+    (VSC, safety car, puncture). ``pack_*`` fields describe the effect on
+    the rest of the field, which our win probability is measured against.
+    ``call`` maps ``(compound, calc_wp)`` to ``(win_prob, recommendation)``.
+    """
+    name: str
+    deg_mult: float = 1.0
+    lap_delta: float = 0.0
+    opening_laps: int = 0
+    opening_sec: float = 0.0
+    total_penalty: float = 0.0
+    pack_deg_mult: float = 1.0
+    pack_lap_delta: float = 0.0
+    pack_opening_laps: int = 0
+    pack_opening_sec: float = 0.0
+    call: Callable[[str, float], tuple[float, str]] | None = None
+
+
+def _rain_call(compound, calc_wp):
+    if compound.upper() in ("SOFT", "MEDIUM", "HARD"):
+        return calc_wp, f"Box for Intermediates immediately! Losing 15s/lap on {compound}s."
+    return 85.0, f"Stay out, {compound} is right for these conditions."
+
+
+# Insertion order is call priority: when events are stacked, the radio
+# recommendation comes from the first active event in this table.
+EVENTS: dict[str, ChaosEvent] = {e.name: e for e in (
+    ChaosEvent("rain", call=_rain_call),
+    ChaosEvent("red_flag",
+               opening_laps=1, opening_sec=25.0,
+               pack_opening_laps=1, pack_opening_sec=25.0,
+               call=lambda c, wp: (wp, "Red flag. Free tyre change in the pit lane, fit fresh Hards.")),
+    ChaosEvent("tyre_failure", opening_laps=1, opening_sec=80.0,
+               call=lambda c, wp: (wp, "Box box box! Sudden puncture, change tyres now!")),
+    ChaosEvent("major_crash",
+               opening_laps=4, opening_sec=40.0,
+               pack_opening_laps=4, pack_opening_sec=40.0,
+               call=lambda c, wp: (min(wp + 15.0, 95.0), "Safety car deployed! Box for fresh tires.")),
+    ChaosEvent("minor_crash",
+               opening_laps=2, opening_sec=30.0,
+               pack_opening_laps=2, pack_opening_sec=30.0,
+               call=lambda c, wp: (wp, "VSC deployed. Maintain positive delta. Cheap pit window.")),
+    ChaosEvent("drive_through", total_penalty=20.0,
+               call=lambda c, wp: (wp, "Drive-through penalty. Serve it this lap and push for clean air.")),
+    ChaosEvent("heatwave", deg_mult=2.0, pack_deg_mult=2.0,
+               call=lambda c, wp: (wp, "Track temps soaring. Tyre deg doubled. Box early for Hards.")),
+    ChaosEvent("tyre_deg", deg_mult=2.5,
+               call=lambda c, wp: (wp, "Tyres dropped off. Revert to Plan B, stop now.")),
+    ChaosEvent("penalty_5s", total_penalty=5.0,
+               call=lambda c, wp: (wp, "5-second penalty. Push hard, build gap to cars behind.")),
+    ChaosEvent("traffic", lap_delta=2.5,
+               call=lambda c, wp: (wp, "DRS train. Consider undercut for clean air.")),
+    ChaosEvent("drs_disabled", lap_delta=0.4, pack_lap_delta=0.4,
+               call=lambda c, wp: (wp, "DRS disabled. Hold track position, overtaking is off.")),
+)}
+
+
+def parse_events(event) -> tuple[str, ...]:
+    """Normalise an event spec into a tuple of known event names.
+
+    Accepts ``None``, a single name, a ``"+"``/``","``-joined string such as
+    ``"rain+major_crash"`` or a list of names. Unknown names are dropped
+    (``strategy_update`` is a plain strategy check with no chaos effect).
+    """
+    if not event:
+        return ()
+    if isinstance(event, str):
+        event = event.replace(",", "+").split("+")
+    names = []
+    for name in event:
+        name = str(name).strip().lower()
+        if name in EVENTS and name not in names:
+            names.append(name)
+    return tuple(sorted(names, key=list(EVENTS).index))
+
+
+@lru_cache(maxsize=256)
+def compose_events(events: tuple[str, ...], laps_left: int):
+    """Compose active events into precomputed per-lap offset arrays.
+
+    Returns ``(our_offsets, pack_offsets, total_penalty)`` where both offset
+    arrays have shape ``(laps_left,)`` and already include tyre degradation.
+    The arrays are cached and read-only.
+    """
+    specs = [EVENTS[name] for name in events]
+    lap_idx = np.arange(laps_left, dtype=float)
+
+    deg = BASE_DEG_RATE * float(np.prod([s.deg_mult for s in specs]))
+    pack_deg = BASE_DEG_RATE * float(np.prod([s.pack_deg_mult for s in specs]))
+
+    ours = lap_idx * deg + sum(s.lap_delta for s in specs)
+    pack = lap_idx * pack_deg + sum(s.pack_lap_delta for s in specs)
+    for s in specs:
+        ours[:s.opening_laps] += s.opening_sec
+        pack[:s.pack_opening_laps] += s.pack_opening_sec
+
+    total_penalty = float(sum(s.total_penalty for s in specs))
+    ours.flags.writeable = False
+    pack.flags.writeable = False
+    return ours, pack, total_penalty
+
+
 # ── Public API ────────────────────────────────────────────────────────────
 
+@profile_calls("run_monte_carlo")
 def run_monte_carlo(current_tire_age: int,
                     compound_str: str,
                     laps_left: int,
@@ -104,10 +274,11 @@ def run_monte_carlo(current_tire_age: int,
                     track_temp: float,
                     humidity: float,
                     rainfall: int,
-                    event: str | None = None,
+                    event: str | list[str] | None = None,
                     position: int = 10,
                     stint: int = 1,
-                    fresh_tyre: bool = False):
+                    fresh_tyre: bool = False,
+                    num_sims: int = NUM_SIMS):
     if xgb_model is None or preprocessor is None or MONZA_EST_PACE is None:
         if not load_resources():
             return {
@@ -116,99 +287,333 @@ def run_monte_carlo(current_tire_age: int,
                 "recommendation": "Error: Model not loaded.",
             }
 
+    events = parse_events(event)
+    key = quantize_state(current_tire_age, compound_str, laps_left, air_temp,
+                         track_temp, humidity, rainfall, events, position,
+                         stint, fresh_tyre)
+    cached = _result_cache.get(key)
+    if cached is not None and cached[1] >= num_sims:
+        _result_cache.move_to_end(key)
+        metrics.SIM_CACHE.inc("hit")
+        return {**cached[0], "events": list(events)}
+    metrics.SIM_CACHE.inc("miss")
+
+    # Simulate the quantized state so a hit returns exactly what a miss would
+    (_, current_tire_age, compound_str, laps_left, air_temp, track_temp,
+     humidity, rainfall, _, position, stint, fresh_tyre) = key
     current_lap = MONZA_TOTAL_LAPS - laps_left
 
     # 1. Two-stage prediction for baseline lap time
-    row = _build_input_row(current_tire_age, compound_str, current_lap,
-                           air_temp, track_temp, humidity, rainfall,
-                           position, stint, fresh_tyre)
-    X = preprocessor.transform(row)
-    residual = float(xgb_model.predict(X)[0])
+    with span("preprocess"):
+        row = _build_input_row(current_tire_age, compound_str, current_lap,
+                               air_temp, track_temp, humidity, rainfall,
+                               position, stint, fresh_tyre)
+        X = preprocessor.transform(row)
+    with span("xgboost"):
+        residual = float(xgb_model.predict(X)[0])
     baseline_lap_time = MONZA_EST_PACE + residual
 
-    # 2. Vectorised Monte Carlo — 10 000 sims x laps_left laps
-    NUM_SIMS = 10_000
-    lap_idx = np.arange(laps_left)
-
-    deg_rate = 0.1
-    if event == "heatwave":
-        deg_rate = 0.2
-    elif event == "tyre_deg":
-        deg_rate = 0.25
-
-    base = baseline_lap_time + lap_idx * deg_rate
-    if event == "traffic":
-        base += 2.5
-
-    sims = np.broadcast_to(base, (NUM_SIMS, laps_left)).copy()
-    sims += np.random.normal(0, 0.5, sims.shape)
-
-    if event == "minor_crash":
-        sims[:, :min(2, laps_left)] += 30.0
-    elif event == "major_crash":
-        sims[:, :min(4, laps_left)] += 40.0
-    elif event == "tyre_failure":
-        sims[:, 0] += 80.0
-
-    totals = np.sum(sims, axis=1)
-    if event == "penalty_5s":
-        totals += 5.0
-
-    mean_total = float(np.mean(totals))
-    
-    # Calculate pack finish time (accounting for global events)
-    pack_baseline_lap = baseline_lap_time
-    pack_deg_rate = 0.1
-    
-    if event == "heatwave":
-        pack_deg_rate = 0.2
-    
-    pack_lap_idx = np.arange(laps_left)
-    pack_base_times = pack_baseline_lap + pack_lap_idx * pack_deg_rate
-    
-    # Apply global event penalties to the pack
-    if event == "minor_crash":
-        # VSC slows pack down for ~2 laps
-        pack_base_times[:min(2, laps_left)] += 30.0
-    elif event == "major_crash":
-        # Safety Car slows pack down for ~4 laps
-        pack_base_times[:min(4, laps_left)] += 40.0
-        
-    # Tally up the adjusted pack finish time
-    pack_finish = np.sum(pack_base_times) + 2.0
-    
-    calc_wp = float(np.sum(totals < pack_finish) / NUM_SIMS * 100)
-
-    wp, rec = _strategy_call(event, compound_str, calc_wp)
+    # 2. Vectorised Monte Carlo — num_sims (10 000) x laps_left laps
+    with span("monte_carlo"):
+        our_offsets, pack_offsets, total_penalty = compose_events(events, laps_left)
 
-    return {
+        sims = np.random.normal(0, LAP_NOISE_SD, (num_sims, laps_left))
+        sims += baseline_lap_time + our_offsets
+
+        totals = np.sum(sims, axis=1) + total_penalty
+        mean_total = float(np.mean(totals))
+
+        # Pack finish time under the same global events (no noise, no penalties)
+        pack_finish = laps_left * baseline_lap_time + float(np.sum(pack_offsets)) + PACK_MARGIN
+
+        calc_wp = float(np.sum(totals < pack_finish) / num_sims * 100)
+
+    wp, rec = _strategy_call(events, compound_str, calc_wp)
+
+    result = {
         "predicted_total_time": round(mean_total, 2),
         "win_probability": int(wp),
         "recommendation": rec,
         "math_baseline_lap": round(baseline_lap_time, 2),
+        "events": list(events),
+    }
+    if cached is None or num_sims >= cached[1]:
+        _result_cache[key] = (result, num_sims)
+    if len(_result_cache) > RESULT_CACHE_SIZE:
+        _result_cache.popitem(last=False)
+    return {**result, "events": list(events)}
+
+
+# ── Batch API (backtests, offline evaluation) ─────────────────────────────
+
+def estimate_base_pace(track_km, corners) -> np.ndarray:
+    """Stage 1 base pace for one or many circuits."""
+    X = np.column_stack([np.atleast_1d(track_km), np.atleast_1d(corners)])
+    return pace_ridge.predict(poly_tf.transform(X))
+
+
+def stage2_frame(tire_age, compound, lap_number, air_temp, track_temp,
+                 humidity, rainfall, position=10, stint=1, fresh_tyre=False,
+                 est_base_pace=None, total_laps=MONZA_TOTAL_LAPS) -> pd.DataFrame:
+    """Stage 2 input frame from scalars or equal-length arrays (broadcast)."""
+    lap_number = np.asarray(lap_number, dtype=float)
+    cols = np.broadcast_arrays(
+        MONZA_EST_PACE if est_base_pace is None else est_base_pace,
+        np.asarray(fresh_tyre).astype(int),
+        1.0 - lap_number / np.asarray(total_laps, dtype=float),
+        lap_number, position, stint, tire_age,
+        np.char.upper(np.asarray(compound, dtype=str)),
+        air_temp, track_temp, humidity, rainfall)
+    names = ("EstBasePace", "FreshTyre", "FuelLoad", "LapNumber", "Position",
+             "Stint", "TyreLife", "Compound", "AirTemp", "TrackTemp",
+             "Humidity", "Rainfall")
+    return pd.DataFrame({n: np.atleast_1d(c) for n, c in zip(names, cols)})
+
+
+def predict_lap_times(frame: pd.DataFrame) -> np.ndarray:
+    """Stage 1 + Stage 2 lap time for every row, in one predict call."""
+    if xgb_model is None and not load_resources():
+        raise RuntimeError("Model not loaded")
+    with span("preprocess"):
+        X = preprocessor.transform(frame)
+    with span("xgboost"):
+        residual = xgb_model.predict(X)
+    return frame["EstBasePace"].to_numpy(dtype=float) + residual
+
+
+def simulate_batch(baselines, laps_left, event=None, num_sims: int = NUM_SIMS,
+                   rng: np.random.Generator | None = None,
+                   max_elements: int = 20_000_000) -> dict:
+    """Monte Carlo for many scenarios at once (same model as run_monte_carlo).
+
+    Only race totals matter here, and a sum of ``laps_left`` iid
+    N(0, LAP_NOISE_SD²) laps is exactly N(0, laps_left·LAP_NOISE_SD²), so each
+    scenario draws ``num_sims`` totals directly instead of a lap matrix.
+    Scenarios are processed in chunks of at most ``max_elements`` draws.
+    Returns arrays ``predicted_total_time`` and ``win_probability`` (0–100).
+    """
+    rng = rng or np.random.default_rng()
+    baselines = np.asarray(baselines, dtype=float)
+    laps_left = np.maximum(np.asarray(laps_left, dtype=int), 1)
+    events = parse_events(event)
+
+    # Event offsets only depend on laps_left: compose once per distinct value
+    uniq, inv = np.unique(laps_left, return_inverse=True)
+    our_sum = np.empty(len(uniq))
+    pack_sum = np.empty(len(uniq))
+    penalty = 0.0
+    for k, L in enumerate(uniq):
+        ours, pack, penalty = compose_events(events, int(L))
+        our_sum[k], pack_sum[k] = ours.sum(), pack.sum()
+
+    expected = baselines * laps_left + our_sum[inv] + penalty
+    pack_finish = baselines * laps_left + pack_sum[inv] + PACK_MARGIN
+    sd = LAP_NOISE_SD * np.sqrt(laps_left)
+
+    mean_total = np.empty(len(baselines))
+    win_prob = np.empty(len(baselines))
+    chunk = max(1, max_elements // num_sims)
+    with span("monte_carlo_batch"):
+        for lo in range(0, len(baselines), chunk):
+            hi = lo + chunk
+            totals = expected[lo:hi, None] + rng.standard_normal(
+                (len(expected[lo:hi]), num_sims)) * sd[lo:hi, None]
+            mean_total[lo:hi] = totals.mean(axis=1)
+            win_prob[lo:hi] = (totals < pack_finish[lo:hi, None]).mean(axis=1) * 100
+    return {"predicted_total_time": mean_total, "win_probability": win_prob}
+
+
+SCENARIO_DEFAULTS = {
+    "current_tire_age": 15, "compound": "MEDIUM", "laps_left": 30,
+    "position": 10, "stint": 1, "fresh_tyre": False, "air_temp": 25.0,
+    "track_temp": 35.0, "humidity": 50.0, "rainfall": 0, "event": None,
+}
+
+
+def clamp_laps_left(laps_left) -> int:
+    """Client-supplied laps_left bounded to 1..MONZA_TOTAL_LAPS."""
+    return min(max(int(laps_left), 1), MONZA_TOTAL_LAPS)
+
+
+def run_scenarios(scenarios: list[dict], num_sims: int = NUM_SIMS,
+                  rng: np.random.Generator | None = None) -> list[dict]:
+    """``run_monte_carlo`` for many /ws/chaos-style payloads at once.
+
+    Every scenario shares one Stage 2 predict call; the Monte Carlo runs
+    once per distinct event combination through ``simulate_batch``.
+    Results come back in input order in run_monte_carlo's shape; a scenario
+    that cannot be parsed gets ``{"error": ...}`` instead.
+    """
+    results: list[dict | None] = [None] * len(scenarios)
+    ok, cols = [], {k: [] for k in SCENARIO_DEFAULTS}
+    for i, scenario in enumerate(scenarios):
+        try:
+            s = {**SCENARIO_DEFAULTS, **scenario}
+            row = {
+                "current_tire_age": int(s["current_tire_age"]),
+                "compound": str(s["compound"]).upper(),
+                "laps_left": clamp_laps_left(s["laps_left"]),
+                "position": int(s["position"]),
+                "stint": int(s["stint"]),
+                "fresh_tyre": bool(s["fresh_tyre"]),
+                "air_temp": float(s["air_temp"]),
+                "track_temp": float(s["track_temp"]),
+                "humidity": float(s["humidity"]),
+                "rainfall": int(s["rainfall"]),
+                "event": parse_events(s["event"]),
+            }
+        except (TypeError, ValueError) as e:
+            results[i] = {"error": f"invalid scenario: {e}"}
+            continue
+        ok.append(i)
+        for k, v in row.items():
+            cols[k].append(v)
+    if not ok:
+        return results
+
+    laps_left = np.array(cols["laps_left"])
+    frame = stage2_frame(cols["current_tire_age"], cols["compound"],
+                         MONZA_TOTAL_LAPS - laps_left, cols["air_temp"],
+                         cols["track_temp"], cols["humidity"], cols["rainfall"],
+                         position=cols["position"], stint=cols["stint"],
+                         fresh_tyre=cols["fresh_tyre"])
+    baselines = predict_lap_times(frame)
+
+    groups: dict[tuple, list[int]] = {}
+    for k, events in enumerate(cols["event"]):
+        groups.setdefault(events, []).append(k)
+    for events, rows in groups.items():
+        rows = np.asarray(rows)
+        out = simulate_batch(baselines[rows], laps_left[rows], event=list(events),
+                             num_sims=num_sims, rng=rng)
+        for k, total, calc_wp in zip(rows, out["predicted_total_time"],
+                                     out["win_probability"]):
+            wp, rec = _strategy_call(events, cols["compound"][k], float(calc_wp))
+            results[ok[k]] = {
+                "predicted_total_time": round(float(total), 2),
+                "win_probability": int(wp),
+                "recommendation": rec,
+                "math_baseline_lap": round(float(baselines[k]), 2),
+                "events": list(events),
+            }
+    return results
+
+# ── Head-to-head: undercut / overcut vs one rival ─────────────────────────
+
+PIT_LOSS_S = 23.0              # Monza pit-lane time loss, s
+PIT_LOSS_SD = 0.8              # stop-to-stop variation (crew, traffic), s
+IN_LAP_DELTA = 0.4             # pushing an in-lap on worn tyres, s
+WARMUP_PENALTY = (1.2, 0.4)    # out-lap and second lap on a cold new set, s
+UNDERCUT_WINDOW = 6            # candidate pit laps (0 = this lap) per car
+
+
+def _next_compound(compound: str) -> str:
+    return "MEDIUM" if compound.upper() == "HARD" else "HARD"
+
+
+def _stint_totals(times_old: np.ndarray, times_new: np.ndarray) -> np.ndarray:
+    """Deterministic time over the horizon for each pit lap p (shape (W,)).
+
+    ``times_old[l]`` is lap l on the current set; ``times_new[p, l]`` is lap l
+    on a new set fitted at the end of lap p.
+    """
+    W, H = times_new.shape
+    lap = np.arange(H)[None, :]
+    stop = np.arange(W)[:, None]
+    on_old = lap <= stop
+    warm = np.zeros((W, H))
+    for k, pen in enumerate(WARMUP_PENALTY):
+        warm += np.where(lap == stop + 1 + k, pen, 0.0)
+    laps = np.where(on_old, times_old[None, :], times_new + warm)
+    return laps.sum(axis=1) + IN_LAP_DELTA + PIT_LOSS_S
+
+
+def run_undercut(ours: dict, rival: dict, gap: float, laps_left: int,
+                 air_temp: float = 25.0, track_temp: float = 35.0,
+                 humidity: float = 50.0, rainfall: int = 0,
+                 window: int = UNDERCUT_WINDOW, num_sims: int = NUM_SIMS,
+                 rng: np.random.Generator | None = None) -> dict:
+    """Probability that we finish the pit cycle ahead of ``rival``.
+
+    ``ours``/``rival``: ``{"tire_age", "compound", "position", "stint",
+    "new_compound"}`` (``new_compound`` defaults to the other hard-ish set).
+    ``gap``: seconds the rival is ahead of us on the road (negative if
+    behind). Every combination of our pit lap × their pit lap within
+    ``window`` laps is evaluated on the same paired draws (common random
+    numbers), so differences between combinations reflect strategy, not
+    sampling noise.
+    """
+    if xgb_model is None and not load_resources():
+        return {"error": "Model not loaded."}
+
+    window = max(1, min(window, laps_left - 1))
+    horizon = window + len(WARMUP_PENALTY) + 1
+    horizon = min(horizon, laps_left)
+    current_lap = MONZA_TOTAL_LAPS - laps_left
+    laps = current_lap + 1 + np.arange(horizon)
+
+    # One Stage 2 call for both cars: old set per lap + new set per (p, lap)
+    frames, sizes = [], []
+    for car in (ours, rival):
+        age0 = int(car.get("tire_age", 15))
+        compound = str(car.get("compound", "MEDIUM")).upper()
+        new_compound = str(car.get("new_compound") or _next_compound(compound)).upper()
+        stint = int(car.get("stint", 1))
+        P, L = np.meshgrid(np.arange(window), np.arange(horizon), indexing="ij")
+        common = dict(position=int(car.get("position", 10)), air_temp=air_temp,
+                      track_temp=track_temp, humidity=humidity, rainfall=rainfall)
+        frames.append(stage2_frame(age0 + 1 + np.arange(horizon), compound, laps,
+                                   stint=stint, **common))
+        frames.append(stage2_frame(np.maximum(L - P, 1).ravel(), new_compound,
+                                   laps[L.ravel()], stint=stint + 1,
+                                   fresh_tyre=True, **common))
+        sizes += [horizon, window * horizon]
+    with span("undercut_predict"):
+        times = predict_lap_times(pd.concat(frames, ignore_index=True))
+    parts = np.split(times, np.cumsum(sizes)[:-1])
+    ours_total = _stint_totals(parts[0], parts[1].reshape(window, horizon))
+    rival_total = _stint_totals(parts[2], parts[3].reshape(window, horizon))
+
+    # Paired draws: each sim has one noise total + one pit-stop error per car,
+    # shared by every (our lap, rival lap) combination
+    rng = rng or np.random.default_rng()
+    with span("undercut_sims"):
+        lap_sd = LAP_NOISE_SD * np.sqrt(horizon)
+        noise = (rng.standard_normal((num_sims, 2)) * lap_sd
+                 + rng.standard_normal((num_sims, 2)) * PIT_LOSS_SD)
+        deficit = (gap
+                   + ours_total[None, :, None] + noise[:, 0, None, None]
+                   - rival_total[None, None, :] - noise[:, 1, None, None])
+        prob = (deficit < 0).mean(axis=0) * 100
+
+    pit_laps = (current_lap + 1 + np.arange(window)).tolist()
+    undercut = float(prob[0, 1]) if window > 1 else float(prob[0, 0])
+    overcut = float(prob[1, 0]) if window > 1 else float(prob[0, 0])
+    if undercut >= 50 and undercut >= overcut:
+        rec = f"Box now for the undercut: {undercut:.0f}% we come out ahead."
+    elif overcut >= 50:
+        rec = f"Stay out and overcut: {overcut:.0f}% we're ahead after their stop."
+    else:
+        rec = "Neither undercut nor overcut clears them. Hold position and cover."
+    best = np.unravel_index(int(np.argmax(prob)), prob.shape)
+    return {
+        "pit_laps": pit_laps,
+        "undercut_probability": np.round(prob, 1).tolist(),
+        "undercut_now": round(undercut, 1),
+        "overcut_now": round(overcut, 1),
+        "best_combination": {"our_pit_lap": pit_laps[best[0]],
+                             "rival_pit_lap": pit_laps[best[1]],
+                             "probability": round(float(prob[best]), 1)},
+        "expected_delta_s": round(float(gap + ours_total[0] - rival_total[min(1, window - 1)]), 2),
+        "recommendation": rec,
     }
 
 
-def _strategy_call(event, compound, calc_wp):
-    c = compound.upper()
-    if event == "rain":
-        if c in ("SOFT", "MEDIUM", "HARD"):
-            return calc_wp, f"Box for Intermediates immediately! Losing 15s/lap on {compound}s."
-        return 85.0, f"Stay out, {compound} is right for these conditions."
-    if event == "tyre_failure":
-        return calc_wp, "Box box box! Sudden puncture, change tyres now!"
-    if event == "major_crash":
-        return min(calc_wp + 15.0, 95.0), "Safety car deployed! Box for fresh tires."
-    if event == "minor_crash":
-        return calc_wp, "VSC deployed. Maintain positive delta. Cheap pit window."
-    if event == "heatwave":
-        return calc_wp, "Track temps soaring. Tyre deg doubled. Box early for Hards."
-    if event == "tyre_deg":
-        return calc_wp, "Tyres dropped off. Revert to Plan B, stop now."
-    if event == "penalty_5s":
-        return calc_wp, "5-second penalty. Push hard, build gap to cars behind."
-    if event == "traffic":
-        return calc_wp, "DRS train. Consider undercut for clean air."
-    if c in ("INTERMEDIATE", "WET"):
+def _strategy_call(events, compound, calc_wp):
+    for name in events:
+        call = EVENTS[name].call
+        if call is not None:
+            return call(compound, calc_wp)
+    if compound.upper() in ("INTERMEDIATE", "WET"):
         return calc_wp, "Box for slicks! Track is dry."
     return calc_wp, f"Pace nominal on {compound}s. Maintain strategy."
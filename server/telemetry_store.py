@@ -0,0 +1,149 @@
+"""
+telemetry_store.py
+------------------
+Memory-mapped columnar store for every car's position telemetry.
+
+Layout (one directory per race, e.g. data/telemetry/italy/):
+
+    meta.json     drivers, channel names/dtypes, per-driver row offsets
+    time.npy      float64 session seconds, sorted within each driver
+    x.npy, y.npy, z.npy, speed.npy   float32, one value per sample
+
+Rows are grouped by driver, so a driver's samples are one contiguous range
+``offsets[i]:offsets[i+1]`` and a time window inside it is two
+``np.searchsorted`` calls. Channels are opened with ``mmap_mode="r"``:
+``window()`` returns views into the mapped files, so only the pages a
+query touches are ever read and a full race (20 cars × 90 min) never has to
+fit in RAM.
+
+get_f1_data.py writes the store with ``write_store(session, path)``.
+"""
+
+import json
+import os
+
+import numpy as np
+
+TELEMETRY_DIR = "data/telemetry"
+CHANNELS = {"time": "<f8", "x": "<f4", "y": "<f4", "z": "<f4", "speed": "<f4"}
+
+
+def store_path(gp: str) -> str:
+    return os.path.join(TELEMETRY_DIR, gp.lower().replace(" ", "_"))
+
+
+def write_store(session, path: str) -> int:
+    """Write every driver's position telemetry from a loaded FastF1 session.
+
+    Speed comes from car data and is interpolated onto the position
+    timestamps. Each channel is filled through ``open_memmap`` one driver at
+    a time. Returns the number of rows written.
+    """
+    per_driver = []
+    for number in session.drivers:
+        pos = session.pos_data.get(number)
+        if pos is None or pos.empty:
+            continue
+        t = pos["SessionTime"].dt.total_seconds().to_numpy()
+        ok = ~np.isnan(t)
+        order = np.argsort(t[ok], kind="stable")
+        columns = {
+            "time": t[ok][order],
+            "x": pos["X"].to_numpy(dtype=float)[ok][order],
+            "y": pos["Y"].to_numpy(dtype=float)[ok][order],
+            "z": pos["Z"].to_numpy(dtype=float)[ok][order],
+        }
+        car = session.car_data.get(number)
+        if car is not None and not car.empty:
+            car_t = car["SessionTime"].dt.total_seconds().to_numpy()
+            columns["speed"] = np.interp(columns["time"], car_t,
+                                         car["Speed"].to_numpy(dtype=float))
+        else:
+            columns["speed"] = np.full(len(columns["time"]), np.nan)
+        abbr = str(session.get_driver(number)["Abbreviation"])
+        per_driver.append((abbr, columns))
+
+    per_driver.sort(key=lambda item: item[0])
+    lengths = [len(cols["time"]) for _, cols in per_driver]
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(int)
+    total = int(offsets[-1])
+
+    os.makedirs(path, exist_ok=True)
+    for name, dtype in CHANNELS.items():
+        out = np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"),
+                                        mode="w+", dtype=dtype, shape=(total,))
+        for (_, cols), lo, hi in zip(per_driver, offsets[:-1], offsets[1:]):
+            out[lo:hi] = cols[name]
+        out.flush()
+        del out
+
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({
+            "drivers": [abbr for abbr, _ in per_driver],
+            "offsets": offsets.tolist(),
+            "channels": CHANNELS,
+            "t_min": float(min(c["time"][0] for _, c in per_driver if len(c["time"]))),
+            "t_max": float(max(c["time"][-1] for _, c in per_driver if len(c["time"]))),
+        }, f, indent=2)
+    return total
+
+
+class TelemetryStore:
+    """Read-only, memory-mapped view over a store written by ``write_store``."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.path = path
+        self.drivers: list[str] = meta["drivers"]
+        self.offsets = np.asarray(meta["offsets"], dtype=np.int64)
+        self.t_min = meta["t_min"]
+        self.t_max = meta["t_max"]
+        self.channels = {name: np.load(os.path.join(path, f"{name}.npy"),
+                                       mmap_mode="r")
+                         for name in meta["channels"]}
+        self._row = {d: i for i, d in enumerate(self.drivers)}
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def driver_range(self, driver: str, t0: float, t1: float) -> tuple[int, int]:
+        """Row range ``[lo, hi)`` of ``driver``'s samples with t0 <= time <= t1."""
+        i = self._row[driver]
+        lo, hi = int(self.offsets[i]), int(self.offsets[i + 1])
+        times = self.channels["time"][lo:hi]
+        return (lo + int(np.searchsorted(times, t0, side="left")),
+                lo + int(np.searchsorted(times, t1, side="right")))
+
+    def window(self, t0: float, t1: float, drivers=None, channels=None,
+               step: int = 1) -> dict[str, dict[str, np.ndarray]]:
+        """``{driver: {channel: array}}`` for t0 <= time <= t1.
+
+        Arrays are views into the memory-mapped files (``step`` > 1 gives a
+        strided view, still without copying).
+        """
+        drivers = self.drivers if drivers is None else [
+            d for d in drivers if d in self._row]
+        channels = list(self.channels) if channels is None else [
+            c for c in channels if c in self.channels]
+        if "time" not in channels:
+            channels = ["time"] + channels
+        step = max(int(step), 1)
+        out = {}
+        for driver in drivers:
+            lo, hi = self.driver_range(driver, t0, t1)
+            out[driver] = {c: self.channels[c][lo:hi:step] for c in channels}
+        return out
+
+
+_stores: dict[str, TelemetryStore] = {}
+
+
+def get_store(gp: str) -> TelemetryStore | None:
+    """Opened store for ``gp`` (cached), or None if it was never written."""
+    path = store_path(gp)
+    if path not in _stores:
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        _stores[path] = TelemetryStore(path)
+    return _stores[path]
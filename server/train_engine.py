@@ -60,6 +60,7 @@ ID_COLS = [
     "PitOutTime", "PitInTime",
     "Sector1Time", "Sector2Time", "Sector3Time",
     "SpeedI1", "SpeedI2", "SpeedFL", "SpeedST",
+    "Time", "LapStartTime",
 ]
 
 